@@ -0,0 +1,59 @@
+"""game templates
+
+Revision ID: 3c8e5a1f9d42
+Revises: 7b1d4c9e2f30
+Create Date: 2026-10-18 11:03:27.540391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8e5a1f9d42'
+down_revision: Union[str, Sequence[str], None] = '7b1d4c9e2f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Пул заранее собранных игр
+    op.create_table(
+        "game_templates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "version_id",
+            sa.Integer(),
+            sa.ForeignKey("collection_versions.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("mode", sa.String(40), nullable=False),
+        sa.Column("seed", sa.Integer(), nullable=False),
+        sa.Column("total_rounds", sa.Integer(), nullable=False),
+        sa.Column(
+            "rounds",
+            sa.JSON(),
+            nullable=False,
+            comment="раунды в формате game_rounds (без game_id/ord/ответов)",
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+            nullable=False,
+        ),
+    )
+
+    # выборка шаблона на claim: WHERE version_id AND mode ORDER BY id
+    op.create_index(
+        "ix_game_templates_version_mode",
+        "game_templates",
+        ["version_id", "mode", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_game_templates_version_mode", table_name="game_templates")
+    op.drop_table("game_templates")
@@ -0,0 +1,59 @@
+"""collection version delta
+
+Revision ID: 4f6a8c2e1b97
+Revises: 9d4b7e2a1c65
+Create Date: 2026-10-18 13:05:21.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6a8c2e1b97'
+down_revision: Union[str, Sequence[str], None] = '9d4b7e2a1c65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "collection_versions",
+        sa.Column(
+            "content_hash",
+            sa.String(64),
+            nullable=True,
+            comment="sha256 правила и выдачи tmdb-sync; совпал с последней версией — новую не создаём",
+        ),
+    )
+    # существующие версии — полные снимки (base_version_id IS NULL)
+    op.add_column(
+        "collection_versions",
+        sa.Column(
+            "base_version_id",
+            sa.Integer(),
+            sa.ForeignKey("collection_versions.id", name="fk_collection_versions_base_version_id"),
+            nullable=True,
+            comment="полный снимок, относительно которого хранятся изменённые позиции",
+        ),
+    )
+
+
+def downgrade() -> None:
+    # дельты без базы не прочитать: разворачиваем их в полные снимки
+    op.execute(
+        """
+        INSERT INTO collection_items (version_id, ord, tmdb_id, _type, title, title_ru, pool_keys)
+        SELECT v.id, b.ord, b.tmdb_id, b._type, b.title, b.title_ru, b.pool_keys
+        FROM collection_versions v
+        JOIN collection_items b ON b.version_id = v.base_version_id AND b.ord <= v.size
+        WHERE NOT EXISTS (
+            SELECT 1 FROM collection_items d WHERE d.version_id = v.id AND d.ord = b.ord
+        )
+        """
+    )
+    op.drop_constraint("fk_collection_versions_base_version_id", "collection_versions", type_="foreignkey")
+    op.drop_column("collection_versions", "base_version_id")
+    op.drop_column("collection_versions", "content_hash")
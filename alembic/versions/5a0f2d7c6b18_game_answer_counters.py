@@ -0,0 +1,51 @@
+"""game answer counters
+
+Revision ID: 5a0f2d7c6b18
+Revises: 3c8e5a1f9d42
+Create Date: 2026-10-18 11:47:09.214550
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a0f2d7c6b18'
+down_revision: Union[str, Sequence[str], None] = '3c8e5a1f9d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "games",
+        sa.Column("answered_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "games",
+        sa.Column("correct_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    # заполняем счётчики для уже существующих игр
+    op.execute(
+        """
+        UPDATE games g
+        SET answered_count = s.answered,
+            correct_count = s.correct
+        FROM (
+            SELECT game_id,
+                   count(*) FILTER (WHERE answered_index IS NOT NULL) AS answered,
+                   count(*) FILTER (WHERE is_correct) AS correct
+            FROM game_rounds
+            GROUP BY game_id
+        ) s
+        WHERE s.game_id = g.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("games", "correct_count")
+    op.drop_column("games", "answered_count")
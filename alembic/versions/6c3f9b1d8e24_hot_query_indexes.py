@@ -0,0 +1,47 @@
+"""hot query indexes
+
+Revision ID: 6c3f9b1d8e24
+Revises: e1c4a7f3b258
+Create Date: 2026-10-18 14:51:16.093327
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c3f9b1d8e24'
+down_revision: Union[str, Sequence[str], None] = 'e1c4a7f3b258'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # проверка FK base_version_id при удалении версии
+    op.create_index(
+        "ix_collection_versions_base_version_id",
+        "collection_versions",
+        ["base_version_id"],
+        postgresql_where=sa.text("base_version_id IS NOT NULL"),
+    )
+
+    # популярные версии для пула игр: WHERE created_at >= :since
+    op.create_index("ix_games_created_at", "games", ["created_at"])
+
+    # очередь компиляций: claim берёт самую старую queued/running
+    op.create_index(
+        "ix_compile_jobs_pending",
+        "compile_jobs",
+        ["id"],
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+    op.create_index("ix_compile_jobs_collection_id", "compile_jobs", ["collection_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_compile_jobs_collection_id", table_name="compile_jobs")
+    op.drop_index("ix_compile_jobs_pending", table_name="compile_jobs")
+    op.drop_index("ix_games_created_at", table_name="games")
+    op.drop_index("ix_collection_versions_base_version_id", table_name="collection_versions")
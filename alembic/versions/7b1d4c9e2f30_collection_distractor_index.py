@@ -0,0 +1,57 @@
+"""collection distractor index
+
+Revision ID: 7b1d4c9e2f30
+Revises: e9c23adad4c8
+Create Date: 2026-10-18 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1d4c9e2f30'
+down_revision: Union[str, Sequence[str], None] = 'e9c23adad4c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("collection_items", sa.Column("title", sa.String(500), nullable=True))
+    op.add_column("collection_items", sa.Column("title_ru", sa.String(500), nullable=True))
+    op.add_column(
+        "collection_items",
+        sa.Column(
+            "pool_keys",
+            sa.JSON(),
+            nullable=True,
+            comment="ключи пулов дистракторов, от самого похожего к самому общему",
+        ),
+    )
+
+    op.create_table(
+        "collection_distractor_pools",
+        sa.Column(
+            "version_id",
+            sa.Integer(),
+            sa.ForeignKey("collection_versions.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("key", sa.String(64), nullable=False),
+        sa.Column(
+            "items",
+            sa.JSON(),
+            nullable=False,
+            comment="кандидаты: список объектов {id,title,title_ru}",
+        ),
+        sa.PrimaryKeyConstraint("version_id", "key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("collection_distractor_pools")
+    op.drop_column("collection_items", "pool_keys")
+    op.drop_column("collection_items", "title_ru")
+    op.drop_column("collection_items", "title")
@@ -0,0 +1,63 @@
+"""titles dictionary, game_rounds.option_ids
+
+Revision ID: 8a2d6f4c1e73
+Revises: 6c3f9b1d8e24
+Create Date: 2026-10-18 15:37:42.518964
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a2d6f4c1e73'
+down_revision: Union[str, Sequence[str], None] = '6c3f9b1d8e24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "titles",
+        sa.Column("tmdb_id", sa.Integer(), nullable=False),
+        sa.Column("_type", sa.String(length=10), nullable=False),
+        sa.Column("title", sa.String(length=500), nullable=True),
+        sa.Column("title_ru", sa.String(length=500), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("tmdb_id", "_type"),
+    )
+
+    # новые раунды хранят только id вариантов; старые (options) не переписываем
+    op.add_column(
+        "game_rounds",
+        sa.Column(
+            "option_ids",
+            sa.JSON(),
+            nullable=True,
+            comment="tmdb_id вариантов в порядке показа; названия — в titles",
+        ),
+    )
+    op.alter_column("game_rounds", "options", existing_type=sa.JSON(), nullable=True)
+
+
+def downgrade() -> None:
+    # собираем options обратно из option_ids и titles
+    op.execute(
+        """
+        UPDATE game_rounds r
+        SET options = (
+            SELECT json_agg(
+                json_build_object('id', o.id::int, 'title', t.title, 'title_ru', t.title_ru)
+                ORDER BY o.n
+            )
+            FROM json_array_elements_text(r.option_ids) WITH ORDINALITY AS o(id, n)
+            LEFT JOIN titles t ON t.tmdb_id = o.id::int AND t._type = r._type
+        )
+        WHERE r.options IS NULL
+        """
+    )
+    op.alter_column("game_rounds", "options", existing_type=sa.JSON(), nullable=False)
+    op.drop_column("game_rounds", "option_ids")
+    op.drop_table("titles")
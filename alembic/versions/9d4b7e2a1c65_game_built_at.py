@@ -0,0 +1,36 @@
+"""game built_at
+
+Revision ID: 9d4b7e2a1c65
+Revises: 5a0f2d7c6b18
+Create Date: 2026-10-18 12:31:52.877013
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b7e2a1c65'
+down_revision: Union[str, Sequence[str], None] = '5a0f2d7c6b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "games",
+        sa.Column(
+            "built_at",
+            sa.DateTime(),
+            nullable=True,
+            comment="когда собраны все раунды; NULL — игра ещё собирается",
+        ),
+    )
+    # все существующие игры собраны целиком при создании
+    op.execute("UPDATE games SET built_at = created_at")
+
+
+def downgrade() -> None:
+    op.drop_column("games", "built_at")
@@ -0,0 +1,27 @@
+"""titles updated_at index
+
+Revision ID: a7e3c1f5d962
+Revises: d5b8e3f7a046
+Create Date: 2026-10-18 21:34:52.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c1f5d962'
+down_revision: Union[str, Sequence[str], None] = 'd5b8e3f7a046'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ревизия словаря названий для ETag страницы раундов: max(updated_at)
+    op.create_index("ix_titles_updated_at", "titles", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_titles_updated_at", table_name="titles")
@@ -0,0 +1,61 @@
+"""compile jobs
+
+Revision ID: b2e7d5a9c013
+Revises: 4f6a8c2e1b97
+Create Date: 2026-10-18 13:48:09.215774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e7d5a9c013'
+down_revision: Union[str, Sequence[str], None] = '4f6a8c2e1b97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Очередь компиляций коллекций
+    op.create_table(
+        "compile_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "collection_id",
+            sa.Integer(),
+            sa.ForeignKey("collections.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("overrides", sa.JSON(), nullable=True),
+        sa.Column("seed", sa.Integer(), nullable=True),
+        sa.Column(
+            "status",
+            sa.String(20),
+            nullable=False,
+            server_default="queued",
+            comment="queued|running|done|failed",
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "version_id",
+            sa.Integer(),
+            sa.ForeignKey("collection_versions.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+            nullable=False,
+        ),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("compile_jobs")
@@ -0,0 +1,42 @@
+"""frame manifests
+
+Revision ID: d5b8e3f7a046
+Revises: 8a2d6f4c1e73
+Create Date: 2026-10-18 16:12:05.740318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b8e3f7a046'
+down_revision: Union[str, Sequence[str], None] = '8a2d6f4c1e73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # манифесты заполняются при компиляции и при первой сборке раундов версии
+    op.create_table(
+        "frame_manifests",
+        sa.Column("tmdb_id", sa.Integer(), nullable=False),
+        sa.Column("_type", sa.String(length=10), nullable=False),
+        sa.Column(
+            "paths",
+            sa.JSON(),
+            nullable=False,
+            comment="пути кадров в порядке tmdb-sync; [] — кадров нет",
+        ),
+        sa.Column("fetched_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("tmdb_id", "_type"),
+    )
+    # фоновое обновление: WHERE fetched_at < :stale ORDER BY fetched_at
+    op.create_index("ix_frame_manifests_fetched_at", "frame_manifests", ["fetched_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_frame_manifests_fetched_at", table_name="frame_manifests")
+    op.drop_table("frame_manifests")
@@ -0,0 +1,54 @@
+"""collection latest published version
+
+Revision ID: e1c4a7f3b258
+Revises: b2e7d5a9c013
+Create Date: 2026-10-18 14:22:37.480951
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1c4a7f3b258'
+down_revision: Union[str, Sequence[str], None] = 'b2e7d5a9c013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "collections",
+        sa.Column(
+            "latest_published_version_id",
+            sa.Integer(),
+            sa.ForeignKey(
+                "collection_versions.id",
+                name="fk_collections_latest_published_version_id",
+                ondelete="SET NULL",
+            ),
+            nullable=True,
+            comment="последняя опубликованная версия; обновляется при компиляции",
+        ),
+    )
+    op.execute(
+        """
+        UPDATE collections c
+        SET latest_published_version_id = (
+            SELECT v.id
+            FROM collection_versions v
+            WHERE v.collection_id = c.id AND v.status = 'published'
+            ORDER BY v.version DESC
+            LIMIT 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "fk_collections_latest_published_version_id", "collections", type_="foreignkey"
+    )
+    op.drop_column("collections", "latest_published_version_id")
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, AliasChoices, ConfigDict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from slugify import slugify
 
 
-from app.core.db import get_session
-from app.models.collection_models import Collection, CollectionVersion, CollectionItem
-from app.services.collections import materialize_collection, DEFAULT_RULE
+from app.core.db import get_session, get_sessionmaker
+from app.core.http import FastJSONResponse, json_line, ndjson_response
+from app.models.collection_models import Collection, CollectionVersion, CollectionItem, CompileJob
+from app.services.collections import DEFAULT_RULE
+from app.services.compile_jobs import enqueue_compile
+from app.services.versions import get_latest_version, version_items_query
+
 
+router = APIRouter(prefix="/collections", tags=["collections"], default_response_class=FastJSONResponse)
 
-router = APIRouter(prefix="/collections", tags=["collections"])
+# строк за один FETCH серверного курсора в NDJSON-режиме
+_STREAM_BATCH = 500
 
 
 class FiltersIn(BaseModel):
@@ -44,20 +53,59 @@ class CollectionCreateIn(BaseModel):
     rule: RuleIn = Field(default_factory=RuleIn)
 
 
+def _collection_out(c: Collection) -> dict:
+    return {
+        "id": c.id,
+        "name": c.name,
+        "slug": c.slug,
+        "description": c.description,
+        "type": c.type,
+    }
+
+
+def _item_out(i: CollectionItem) -> dict:
+    return {"ord": i.ord, "tmdb_id": i.tmdb_id, "_type": i._type}
+
+
+def _ndjson_rows(stmt, to_dict) -> StreamingResponse:
+    """NDJSON-поток строк stmt через серверный курсор (stream_scalars).
+
+    Своя сессия: сессия из зависимости закрывается до отправки тела ответа.
+    """
+    async def ndjson():
+        SessionLocal = get_sessionmaker()
+        async with SessionLocal() as session:
+            rows = await session.stream_scalars(stmt.execution_options(yield_per=_STREAM_BATCH))
+            async for row in rows:
+                yield json_line(to_dict(row))
+
+    return ndjson_response(ndjson())
+
+
 @router.get("")
-async def list_collections(session: AsyncSession = Depends(get_session)):
-    rows = await session.execute(select(Collection))
+async def list_collections(
+    response: Response,
+    after: int = Query(0, ge=0, description="keyset: коллекции с id > after"),
+    limit: int | None = Query(None, ge=1, le=1000, description="размер страницы; без него — все коллекции"),
+    format: Literal["json", "ndjson"] = "json",
+    session: AsyncSession = Depends(get_session),
+):
+    """Коллекции по id. format=ndjson — все коллекции с id > after одним потоком.
+
+    Тело — по-прежнему список. С limit это страница, а id для следующей
+    страницы приходит в заголовке X-Next-After (нет заголовка — страниц больше нет).
+    """
+    stmt = select(Collection).where(Collection.id > after).order_by(Collection.id)
+    if format == "ndjson":
+        return _ndjson_rows(stmt, _collection_out)
+
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    rows = await session.execute(stmt)
     collections = rows.scalars().all()
-    return [
-        {
-            "id": c.id,
-            "name": c.name,
-            "slug": c.slug,
-            "description": c.description,
-            "type": c.type,
-        }
-        for c in collections
-    ]
+    if limit is not None and len(collections) == limit:
+        response.headers["X-Next-After"] = str(collections[-1].id)
+    return [_collection_out(c) for c in collections]
 
 
 @router.post("")
@@ -85,13 +133,41 @@ class CompileIn(BaseModel):
     seed: int | None = None
 
 
-@router.post("/{collection_id}/compile")
+def _job_out(job: CompileJob) -> dict:
+    return {
+        "job_id": job.id,
+        "collection_id": job.collection_id,
+        "status": job.status,
+        "version_id": job.version_id,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+@router.post("/{collection_id}/compile", status_code=202)
 async def compile_collection(collection_id: int, body: CompileIn, session: AsyncSession = Depends(get_session)):
+    """Ставим компиляцию в очередь; статус — GET /collections/{id}/compile/jobs/{job_id}."""
     c = (await session.execute(select(Collection).where(Collection.id == collection_id))).scalar_one_or_none()
     if not c:
         raise HTTPException(404, "collection not found")
-    vid = await materialize_collection(session, c, overrides=body.overrides, seed=body.seed)
-    return {"collection_id": c.id, "version_id": vid}
+    job = await enqueue_compile(session, c.id, overrides=body.overrides, seed=body.seed)
+    return _job_out(job)
+
+
+@router.get("/{collection_id}/compile/jobs/{job_id}")
+async def get_compile_job(collection_id: int, job_id: int, session: AsyncSession = Depends(get_session)):
+    job = await session.scalar(
+        select(CompileJob).where(
+            CompileJob.id == job_id,
+            CompileJob.collection_id == collection_id,
+        )
+    )
+    if not job:
+        raise HTTPException(404, "Compile job not found for this collection")
+    return _job_out(job)
 
 
 @router.get("/{collection_id}")
@@ -117,15 +193,8 @@ async def list_versions(collection_id: int, session: AsyncSession = Depends(get_
 
 
 @router.get("/{collection_id}/versions/latest")
-async def get_latest_version(collection_id: int, session: AsyncSession = Depends(get_session)):
-    row = await session.execute(
-        select(CollectionVersion)
-        .where(CollectionVersion.collection_id == collection_id)
-        .where(CollectionVersion.status == "published")
-        .order_by(CollectionVersion.version.desc())
-        .limit(1)
-    )
-    v = row.scalar_one_or_none()
+async def get_latest_version_endpoint(collection_id: int, session: AsyncSession = Depends(get_session)):
+    v = await get_latest_version(session, collection_id)
     if not v:
         raise HTTPException(404, "No versions for this collection")
     return {"id": v.id, "version": v.version, "size": v.size}
@@ -148,8 +217,15 @@ async def get_version(collection_id: int, version: int, session: AsyncSession =
 async def get_version_items(
     collection_id: int,
     version: int,
+    after: int = Query(0, ge=0, description="keyset: items с ord > after"),
+    limit: int | None = Query(None, ge=1, le=5000, description="размер страницы; без него — все items"),
+    format: Literal["json", "ndjson"] = "json",
     session: AsyncSession = Depends(get_session),
 ):
+    """Items версии по ord. format=ndjson — все items с ord > after одним потоком.
+
+    Без limit отдаются все items (как раньше); с limit — страница и next_after.
+    """
     # 1. валидируем, что такая версия у коллекции есть
     v = await session.scalar(
         select(CollectionVersion).where(
@@ -160,21 +236,21 @@ async def get_version_items(
     if not v:
         raise HTTPException(404, "Version not found for this collection")
 
-    # 2. берём items по PK версии (v.id), а не по номеру версии
-    rows = await session.execute(
-        select(CollectionItem)
-        .where(CollectionItem.version_id == v.id)
-        .order_by(CollectionItem.ord)
-    )
+    # 2. берём items по PK версии (v.id), а не по номеру версии;
+    # у дельта-версий недостающие позиции подтягиваются из базового снимка
+    if format == "ndjson":
+        return _ndjson_rows(version_items_query(v, after=after), _item_out)
+
+    rows = await session.execute(version_items_query(v, after=after, limit=limit))
     items = rows.scalars().all()
+    last_ord = items[-1].ord if items else None
 
     return {
         "collection_id": collection_id,
         "version": version,
         "version_id": v.id,  # на всякий случай отдаём и PK
         "size": v.size,
-        "items": [
-            {"ord": i.ord, "tmdb_id": i.tmdb_id, "_type": i._type}
-            for i in items
-        ],
+        "items": [_item_out(i) for i in items],
+        # ord для следующей страницы, None — страниц больше нет (или limit не задан)
+        "next_after": last_ord if limit is not None and last_ord is not None and last_ord < v.size else None,
     }
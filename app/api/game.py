@@ -1,28 +1,43 @@
 from __future__ import annotations
 
+import hashlib
+from datetime import datetime
 from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from pydantic import BaseModel, Field
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.models.collection_models import Collection, CollectionVersion
+from app.core.config import GAME_MAX_ROUNDS, TITLE_CACHE_TTL
 from app.core.db import get_session
+from app.core.http import FastJSONResponse, json_line, ndjson_response
 from app.models.game import Game, GameRound
-from app.services.games import create_game_from_collection, answer_round, AnswerError
+from app.services.games import (
+    create_game_from_collection,
+    create_game_streaming,
+    answer_round,
+    round_payload,
+    load_round_payload,
+    AnswerError,
+)
+from app.services.game_pool import create_game_from_pool
+from app.services.versions import LatestVersion, get_latest_version
+from app.services.hot_state import HotGame, answer_hot, hot_game
+from app.services.titles import resolve_round_options, titles_revision
 # from .schemas import GameCreate, GameCreated, GameState, RoundOut  # как у тебя разнесено
 
 
-router = APIRouter(prefix="/games", tags=["games"])
+router = APIRouter(prefix="/games", tags=["games"], default_response_class=FastJSONResponse)
 
 
 class GameCreate(BaseModel):
     collection_id: int
     version: Optional[int] = None      # если None — берем последнюю версию
     mode: Literal["ONE_FRAME_FOUR_TITLES", "FOUR_FRAMES_ONE_TITLE"] = "ONE_FRAME_FOUR_TITLES"
-    total_rounds: Optional[int] = None
+    total_rounds: Optional[int] = Field(default=None, ge=1, le=GAME_MAX_ROUNDS)
     seed: Optional[int] = None
 
 
@@ -59,6 +74,20 @@ class RoundOut(BaseModel):
     answered_index: int | None
 
 
+class RoundFramesOut(BaseModel):
+    ord: int
+    frame_paths: list[str]
+    options: list[dict]
+
+
+class RoundsPageOut(BaseModel):
+    game_id: int
+    mode: str
+    total_rounds: int
+    rounds: list[RoundFramesOut]
+    next_after: int | None  # ord для следующей страницы, None — страниц больше нет
+
+
 class AnswerIn(BaseModel):
     answer_index: int
 
@@ -72,40 +101,89 @@ class AnswerOut(BaseModel):
     finished: bool
 
 
+class AnswerNextOut(AnswerOut):
+    next_round: RoundOut | None  # None — это был последний раунд
+
+
+async def _resolve_version(session: AsyncSession, body: GameCreate) -> CollectionVersion | LatestVersion:
+    # 1. без явной версии — последняя опубликованная, из кэша указателя (обычно без запроса в БД)
+    if body.version is None:
+        ver = await get_latest_version(session, body.collection_id)
+        if ver is not None:
+            return ver
+
+    # 2. проверяем, что коллекция существует
+    collection = await session.get(Collection, body.collection_id)
+    if not collection:
+        raise HTTPException(404, "Collection not found")
+    if body.version is None:
+        raise HTTPException(400, "Collection has no compiled versions yet")
+
+    # 3. явно указанная версия
+    ver = await session.scalar(
+        select(CollectionVersion).where(
+            CollectionVersion.collection_id == body.collection_id,
+            CollectionVersion.version == body.version,
+        )
+    )
+    if not ver:
+        raise HTTPException(404, "Collection version not found")
+    return ver
+
+
 @router.post("", response_model=GameCreated, status_code=status.HTTP_201_CREATED)
 async def create_game(
     body: GameCreate,
     session: AsyncSession = Depends(get_session),
 ):
-    # 1. проверяем, что коллекция существует
-    collection = await session.get(Collection, body.collection_id)
-    if not collection:
-        raise HTTPException(404, "Collection not found")
-
-    # 2. выбираем версию
-    if body.version is not None:
-        ver = await session.scalar(
-            select(CollectionVersion).where(
-                CollectionVersion.collection_id == body.collection_id,
-                CollectionVersion.version == body.version,
+    ver = await _resolve_version(session, body)
+
+    # 3. без явных seed/total_rounds годится любая игра — сначала пробуем пул готовых
+    game = None
+    if body.seed is None and body.total_rounds is None:
+        game = await create_game_from_pool(session, version_id=ver.id, mode=body.mode)
+
+    # 4. иначе создаём игру из выбранной версии
+    if game is None:
+        try:
+            game = await create_game_from_collection(
+                session,
+                version_id=ver.id,
+                mode=body.mode,
+                total_rounds=body.total_rounds,
+                seed=body.seed,
             )
-        )
-        if not ver:
-            raise HTTPException(404, "Collection version not found")
-    else:
-        # последняя версия по номеру
-        ver = await session.scalar(
-            select(CollectionVersion)
-            .where(CollectionVersion.collection_id == body.collection_id)
-            .order_by(CollectionVersion.version.desc())
-            .limit(1)
-        )
-        if not ver:
-            raise HTTPException(400, "Collection has no compiled versions yet")
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    if game.total_rounds == 0:
+        raise HTTPException(400, "No rounds could be generated for this collection")
 
-    # 3. создаём игру из выбранной версии
+    return GameCreated(
+        id=game.id,
+        collection_id=body.collection_id,
+        version=ver.version,      # человеческий номер, а не PK
+        mode=game.mode,
+        total_rounds=game.total_rounds,
+        seed=game.seed or 0,
+    )
+
+
+@router.post("/stream", status_code=status.HTTP_201_CREATED)
+async def create_game_stream(
+    body: GameCreate,
+    session: AsyncSession = Depends(get_session),
+):
+    """Создание игры с NDJSON-потоком: первый раунд доступен, как только собран.
+
+    Строки потока:
+      {"type": "game", ...GameCreated}   — игра уже в БД, total_rounds плановое
+      {"type": "round", ...RoundOut}     — по одному на каждый собранный раунд
+      {"type": "done", "total_rounds"}   — итоговое число раундов
+    """
+    ver = await _resolve_version(session, body)
     try:
-        game = await create_game_from_collection(
+        game, events = await create_game_streaming(
             session,
             version_id=ver.id,
             mode=body.mode,
@@ -115,47 +193,61 @@ async def create_game(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
-    if game.total_rounds == 0:
-        raise HTTPException(400, "No rounds could be generated for this collection")
-
-    return GameCreated(
+    header = GameCreated(
         id=game.id,
         collection_id=body.collection_id,
-        version=ver.version,      # человеческий номер, а не PK
+        version=ver.version,
         mode=game.mode,
         total_rounds=game.total_rounds,
         seed=game.seed or 0,
     )
 
+    async def ndjson():
+        yield json_line({"type": "game", **header.model_dump()})
+        async for event in events:
+            if event["type"] == "round":
+                # правильный ответ наружу не отдаём
+                line = {
+                    "type": "round",
+                    **RoundOut(
+                        game_id=game.id,
+                        ord=event["ord"],
+                        mode=game.mode,
+                        total_rounds=game.total_rounds,
+                        frame_paths=event["frame_paths"],
+                        options=event["options"],
+                        answered_index=None,
+                    ).model_dump(),
+                }
+            else:
+                line = event
+            yield json_line(line)
+
+    return ndjson_response(ndjson(), status_code=status.HTTP_201_CREATED)
+
 
 @router.get("/{game_id}/state", response_model=GameState)
 async def get_game_state(
     game_id: int,
     session: AsyncSession = Depends(get_session),
 ):
-    game = await session.get(Game, game_id)
+    # идущая игра — из горячего хранилища, без Postgres
+    game = await hot_game(session, game_id)
+    if game is None:
+        # счётчики ответов лежат прямо в games — раунды не читаем
+        game = await session.get(Game, game_id)
     if not game:
         raise HTTPException(404, "Game not found")
 
-    rounds = (
-        await session.execute(
-            select(GameRound).where(GameRound.game_id == game_id)
-        )
-    ).scalars().all()
-
-    answered = sum(1 for r in rounds if r.answered_index is not None)
-    correct = sum(1 for r in rounds if r.is_correct)
-    finished = game.finished_at is not None
-
     return GameState(
         id=game.id,
         version_id=game.version_id,
         mode=game.mode,
         total_rounds=game.total_rounds,
-        answered=answered,
-        correct=correct,
+        answered=game.answered_count,
+        correct=game.correct_count,
         score=game.score,
-        finished=finished,
+        finished=game.finished_at is not None,
     )
 
 
@@ -165,6 +257,14 @@ async def get_round(
     ord: int,
     session: AsyncSession = Depends(get_session),
 ):
+    # round_payload уже в форме RoundOut — отдаём как есть, без повторной валидации pydantic
+    hot = await hot_game(session, game_id)
+    if hot is not None:
+        gr = hot.rounds.get(ord)
+        if not gr:
+            raise HTTPException(404, "Round not found")
+        return FastJSONResponse(round_payload(hot, gr))
+
     game = await session.get(Game, game_id)
     if not game:
         raise HTTPException(404, "Game not found")
@@ -179,14 +279,111 @@ async def get_round(
     if not gr:
         raise HTTPException(404, "Round not found")
 
-    return RoundOut(
-        game_id=game_id,
-        ord=ord,
-        mode=game.mode,
-        total_rounds=game.total_rounds,
-        frame_paths=gr.frame_paths,
-        options=gr.options,
-        answered_index=gr.answered_index,
+    return FastJSONResponse(await load_round_payload(session, game, gr))
+
+
+def _answer_error_to_http(e: AnswerError) -> HTTPException:
+    # мапим бизнес-ошибки в HTTP
+    msg = str(e)
+    if "Game not found" in msg:
+        return HTTPException(status_code=404, detail=msg)
+    if "Round not found" in msg:
+        return HTTPException(status_code=404, detail=msg)
+    if "Invalid answer index" in msg:
+        return HTTPException(status_code=400, detail=msg)
+    # всё остальное тоже как 400
+    return HTTPException(status_code=400, detail=msg)
+
+
+# кадры раундов после сборки игры не меняются, а названия вариантов
+# приходят из titles и могут быть исправлены: ETag — игра, момент сборки,
+# ревизия titles и страница; после max-age клиент перепроверяет
+_ROUNDS_CACHE_CONTROL = f"private, max-age={int(TITLE_CACHE_TTL)}, must-revalidate"
+
+
+def _rounds_etag(game_id: int, built_at: datetime | None, revision: str, after: int, limit: int) -> str:
+    key = f"{game_id}:{built_at.isoformat() if built_at else ''}:{revision}:{after}:{limit}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # слабое сравнение (RFC 9110): W/"x" совпадает с "x"
+    candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return etag in candidates
+
+
+@router.get("/{game_id}/rounds", response_model=RoundsPageOut)
+async def get_rounds(
+    game_id: int,
+    after: int = Query(0, ge=0, description="вернуть раунды с ord > after"),
+    limit: int = Query(100, ge=1, le=100),
+    if_none_match: str | None = Header(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    """Все раунды игры (страницами) без правильных ответов — для предзагрузки кадров.
+
+    ETag считается до сборки страницы — из id игры, built_at, ревизии titles
+    и параметров страницы: повторный запрос с If-None-Match получает 304, не
+    читая раундов, а исправленное в titles название меняет ревизию и ETag.
+    Пока игра собирается, ETag не выдаём.
+    """
+    game = await hot_game(session, game_id)
+    if game is not None:
+        # горячее хранилище держит только собранные игры; названия в нём —
+        # из ревизии titles на момент загрузки
+        etag = _rounds_etag(game.id, game.built_at, game.titles_revision, after, limit)
+    else:
+        game = await session.get(Game, game_id)
+        if not game:
+            raise HTTPException(404, "Game not found")
+        etag = None
+        if game.built_at is not None:
+            etag = _rounds_etag(game.id, game.built_at, await titles_revision(session), after, limit)
+
+    headers = {"ETag": etag, "Cache-Control": _ROUNDS_CACHE_CONTROL} if etag else {"Cache-Control": "no-store"}
+    if etag and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if isinstance(game, HotGame):
+        rows = [game.rounds[o] for o in sorted(game.rounds) if o > after][:limit]
+        options = [r.options for r in rows]
+    else:
+        rows = (
+            await session.execute(
+                select(
+                    GameRound.ord,
+                    GameRound._type,
+                    GameRound.frame_paths,
+                    GameRound.option_ids,
+                    GameRound.options,
+                )
+                .where(GameRound.game_id == game_id, GameRound.ord > after)
+                .order_by(GameRound.ord)
+                .limit(limit)
+            )
+        ).all()
+        # названия вариантов всей страницы — одним обращением к titles
+        options = await resolve_round_options(session, rows)
+
+    # самый крупный ответ API: собираем RoundsPageOut словарём, без моделей на каждый раунд
+    last_ord = rows[-1].ord if rows else None
+    return FastJSONResponse(
+        {
+            "game_id": game.id,
+            "mode": game.mode,
+            "total_rounds": game.total_rounds,
+            "rounds": [
+                {"ord": r.ord, "frame_paths": r.frame_paths, "options": opts}
+                for r, opts in zip(rows, options)
+            ],
+            "next_after": last_ord if last_ord is not None and last_ord < game.total_rounds else None,
+        },
+        # игра без built_at ещё собирается (потоковое создание) — страница может дополниться
+        headers=headers,
     )
 
 
@@ -198,29 +395,70 @@ async def answer_round_endpoint(
     session: AsyncSession = Depends(get_session),
 ):
     try:
-        game, gr, finished_now = await answer_round(
+        # идущая игра — ответ в горячем хранилище, в Postgres уходит пачкой
+        result = await answer_hot(
             session,
             game_id=game_id,
             ord=ord,
             answer_index=body.answer_index,
         )
+        if result is None:
+            result = await answer_round(
+                session,
+                game_id=game_id,
+                ord=ord,
+                answer_index=body.answer_index,
+            )
     except AnswerError as e:
-        # мапим бизнес-ошибки в HTTP
-        msg = str(e)
-        if "Game not found" in msg:
-            raise HTTPException(status_code=404, detail=msg)
-        if "Round not found" in msg:
-            raise HTTPException(status_code=404, detail=msg)
-        if "Invalid answer index" in msg:
-            raise HTTPException(status_code=400, detail=msg)
-        # всё остальное тоже как 400
-        raise HTTPException(status_code=400, detail=msg)
+        raise _answer_error_to_http(e)
 
     return AnswerOut(
-        game_id=game.id,
-        ord=ord,
-        is_correct=bool(gr.is_correct),
-        correct_index=gr.correct_index,
-        score=game.score,
-        finished=(game.finished_at is not None),
+        game_id=result.game_id,
+        ord=result.ord,
+        is_correct=result.is_correct,
+        correct_index=result.correct_index,
+        score=result.score,
+        finished=result.finished,
+    )
+
+
+@router.post("/{game_id}/round/{ord}/answer-next", response_model=AnswerNextOut)
+async def answer_and_next_endpoint(
+    game_id: int,
+    ord: int,
+    body: AnswerIn,
+    session: AsyncSession = Depends(get_session),
+):
+    """Ответ + счёт + следующий раунд одним запросом и одной транзакцией.
+
+    Заменяет связку POST .../answer -> GET .../round/{ord+1} -> GET .../state.
+    """
+    try:
+        # идущая игра — ответ в горячем хранилище, в Postgres уходит пачкой
+        result = await answer_hot(
+            session,
+            game_id=game_id,
+            ord=ord,
+            answer_index=body.answer_index,
+            with_next=True,
+        )
+        if result is None:
+            result = await answer_round(
+                session,
+                game_id=game_id,
+                ord=ord,
+                answer_index=body.answer_index,
+                with_next=True,
+            )
+    except AnswerError as e:
+        raise _answer_error_to_http(e)
+
+    return AnswerNextOut(
+        game_id=result.game_id,
+        ord=result.ord,
+        is_correct=result.is_correct,
+        correct_index=result.correct_index,
+        score=result.score,
+        finished=result.finished,
+        next_round=RoundOut(**result.next_round) if result.next_round else None,
     )
@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from app.core.db import get_pool
+from app.core.db import raw_connection
 from app.core.tmdb_sync_client import get_movie, get_frames, search_similar
 
 
@@ -18,61 +18,68 @@ async def create_top100(payload: Top100In):
     if len(payload.tmdb_ids) != 100:
         raise HTTPException(400, "need exactly 100 ids")
 
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        tr = conn.transaction()
-        await tr.start()
-        try:
+    # сначала собираем вопросы (сеть), потом одной транзакцией пишем всё пачками
+    questions = []
+    for mid in payload.tmdb_ids:
+        meta = await get_movie(mid)
+        frames = await get_frames(mid)
+        frames = [f["frame_path"] for f in frames if f.get("frame_path")]
+        if not frames:
+            raise HTTPException(400, f"movie {mid} has no frames")
+
+        # выбираем 1 лучший кадр (MVP: первый)
+        frame_paths = [frames[0]]
+
+        # собираем пул дистракторов
+        year = int(meta["release_date"][:4]) if meta.get("release_date") else None
+        genre_ids = meta.get("genre_ids", [])
+        candidates = await search_similar(genre_ids, year, _type=meta.get("_type","movie"), limit=120)
+
+        pool_ids = []
+        for c in candidates:
+            cid = c["id"]
+            if cid != mid and cid not in pool_ids:
+                pool_ids.append(cid)
+            if len(pool_ids) >= 16:
+                break
+        if len(pool_ids) < 6:  # запас на выбор 3-х
+            raise HTTPException(400, f"not enough distractors for {mid}")
+
+        questions.append((mid, frame_paths, pool_ids))
+
+    async with raw_connection() as conn:
+        async with conn.transaction():
             set_id = await conn.fetchval(
                 "INSERT INTO sets(name, type, size) VALUES($1,'STATIC',$2) RETURNING id",
                 payload.name, len(payload.tmdb_ids)
             )
             # фиксируем порядок
-            for i, mid in enumerate(payload.tmdb_ids, start=1):
-                await conn.execute(
-                    "INSERT INTO set_items(set_id, ord, tmdb_id) VALUES($1,$2,$3)",
-                    set_id, i, mid
-                )
-            # строим questions + set_questions
-            qids = []
-            for i, mid in enumerate(payload.tmdb_ids, start=1):
-                meta = await get_movie(mid)
-                frames = await get_frames(mid)
-                frames = [f["frame_path"] for f in frames if f.get("frame_path")]
-                if not frames:
-                    raise HTTPException(400, f"movie {mid} has no frames")
-
-                # выбираем 1 лучший кадр (MVP: первый)
-                frame_paths = [frames[0]]
-
-                # собираем пул дистракторов
-                year = int(meta["release_date"][:4]) if meta.get("release_date") else None
-                genre_ids = meta.get("genre_ids", [])
-                candidates = await search_similar(genre_ids, year, _type=meta.get("_type","movie"), limit=120)
-
-                pool_ids = []
-                for c in candidates:
-                    cid = c["id"]
-                    if cid != mid and cid not in pool_ids:
-                        pool_ids.append(cid)
-                    if len(pool_ids) >= 16:
-                        break
-                if len(pool_ids) < 6:  # запас на выбор 3-х
-                    raise HTTPException(400, f"not enough distractors for {mid}")
-
-                qid = await conn.fetchval(
-                    "INSERT INTO questions(type, tmdb_id, frame_paths, distractor_pool) VALUES($1,$2,$3,$4) RETURNING id",
-                    "ONE_FRAME_FOUR_TITLES", mid, frame_paths, pool_ids
-                )
-                qids.append(qid)
+            await conn.copy_records_to_table(
+                "set_items",
+                columns=["set_id", "ord", "tmdb_id"],
+                records=[(set_id, i, mid) for i, mid in enumerate(payload.tmdb_ids, start=1)],
+            )
 
-                await conn.execute(
-                    "INSERT INTO set_questions(set_id, ord, question_id) VALUES($1,$2,$3)",
-                    set_id, i, qid
+            # id вопросов берём из последовательности заранее, чтобы писать их через COPY
+            qids = [
+                r["id"] for r in await conn.fetch(
+                    "SELECT nextval(pg_get_serial_sequence('questions', 'id')) AS id "
+                    "FROM generate_series(1, $1)",
+                    len(questions),
                 )
+            ]
+            await conn.copy_records_to_table(
+                "questions",
+                columns=["id", "type", "tmdb_id", "frame_paths", "distractor_pool"],
+                records=[
+                    (qid, "ONE_FRAME_FOUR_TITLES", mid, frame_paths, pool_ids)
+                    for qid, (mid, frame_paths, pool_ids) in zip(qids, questions)
+                ],
+            )
+            await conn.copy_records_to_table(
+                "set_questions",
+                columns=["set_id", "ord", "question_id"],
+                records=[(set_id, i, qid) for i, qid in enumerate(qids, start=1)],
+            )
 
-            await tr.commit()
-            return {"set_id": set_id, "questions": len(qids)}
-        except Exception:
-            await tr.rollback()
-            raise
+        return {"set_id": set_id, "questions": len(qids)}
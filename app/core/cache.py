@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class AsyncTTLCache:
+    """Ограниченный in-process кэш: TTL + LRU-вытеснение + single-flight.
+
+    Параллельные запросы одного и того же ключа ждут один общий загрузчик,
+    а не идут в сеть каждый сам по себе. Значения отдаются как есть (без копий),
+    поэтому вызывающий код не должен их мутировать.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # дождались чужой загрузки вместо своей
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        """(найдено, значение); просроченные записи выкидываются."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def lookup(self, key: Hashable) -> tuple[bool, Any]:
+        """Как get, но считает попадания (для пакетных загрузок мимо get_or_load).
+
+        Промахи считает тот, кто потом загружает значение: get_or_load
+        или вызывающий код через record_misses.
+        """
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+        return found, value
+
+    def record_misses(self, n: int) -> None:
+        self.misses += n
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float | None = None,
+    ) -> Any:
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value
+
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            try:
+                value = await asyncio.shield(fut)
+                self.coalesced += 1
+                return value
+            except asyncio.CancelledError:
+                # отменили загрузчика, а не нас — пробуем сами
+                task = asyncio.current_task()
+                if fut.cancelled() and task is not None and not task.cancelling():
+                    continue
+                raise
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # помечаем как прочитанное, если ждущих не было
+            raise
+        else:
+            self.set(key, value, ttl)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
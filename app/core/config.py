@@ -8,6 +8,84 @@ TMDB_CDN_BASE = os.getenv("TMDB_CDN_BASE", "https://image.tmdb.org/t/p")
 TMDB_CDN_SIZE = os.getenv("TMDB_CDN_SIZE", "w500")  # например
 
 
+def _env_bool(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).strip().lower() in {"1", "true", "yes", "on"}
+
+
+# ---------- пул соединений к Postgres (один на процесс) ----------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))                       # постоянных соединений
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))                  # сверх pool_size на пиках, потом закрываются
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))               # сек ждём свободное соединение
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))               # сек: соединение старше — переоткрываем; -1 — никогда
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # подготовленных запросов на соединение; 0 — для pgbouncer
+
+
+# ---------- HTTP-клиент к tmdb-sync ----------
+TMDB_SYNC_TIMEOUT = float(os.getenv("TMDB_SYNC_TIMEOUT", "30"))                  # сек, на весь запрос
+TMDB_SYNC_CONNECT_TIMEOUT = float(os.getenv("TMDB_SYNC_CONNECT_TIMEOUT", "5"))   # сек, на установку соединения
+TMDB_SYNC_MAX_CONNECTIONS = int(os.getenv("TMDB_SYNC_MAX_CONNECTIONS", "100"))
+TMDB_SYNC_MAX_KEEPALIVE = int(os.getenv("TMDB_SYNC_MAX_KEEPALIVE", "20"))
+TMDB_SYNC_KEEPALIVE_EXPIRY = float(os.getenv("TMDB_SYNC_KEEPALIVE_EXPIRY", "30"))
+TMDB_SYNC_HTTP2 = _env_bool("TMDB_SYNC_HTTP2", "1")  # включится, только если установлен пакет h2
+TMDB_SYNC_BULK_CHUNK = int(os.getenv("TMDB_SYNC_BULK_CHUNK", "100"))             # id в одном пакетном запросе
+TMDB_SYNC_BULK_CONCURRENCY = int(os.getenv("TMDB_SYNC_BULK_CONCURRENCY", "16"))  # запросов get_*_bulk сразу на весь процесс (пакетных или одиночных)
+TMDB_SYNC_BULK_RECHECK = float(os.getenv("TMDB_SYNC_BULK_RECHECK", "300"))       # сек: через сколько снова пробуем пакетную ручку после 404/405
+
+# ---------- кэш ответов tmdb-sync (in-process) ----------
+TMDB_CACHE_MAXSIZE = int(os.getenv("TMDB_CACHE_MAXSIZE", "20000"))           # записей; 0 — кэш выключен
+TMDB_CACHE_SEARCH_TTL = float(os.getenv("TMDB_CACHE_SEARCH_TTL", "600"))    # сек, /movies/search
+TMDB_CACHE_MOVIE_TTL = float(os.getenv("TMDB_CACHE_MOVIE_TTL", "3600"))     # сек, /movies/{id}
+TMDB_CACHE_FRAMES_TTL = float(os.getenv("TMDB_CACHE_FRAMES_TTL", "3600"))   # сек, /movies/{id}/frames
+
+# ---------- словарь названий (titles) ----------
+TITLE_CACHE_SIZE = int(os.getenv("TITLE_CACHE_SIZE", "100000"))  # названий в памяти процесса
+TITLE_CACHE_TTL = float(os.getenv("TITLE_CACHE_TTL", "600"))     # сек: через сколько правка названия в titles видна этому процессу
+
+# ---------- манифесты кадров (frame_manifests) ----------
+FRAME_MANIFEST_TTL = int(os.getenv("FRAME_MANIFEST_TTL", "604800"))                         # сек: манифест старше — обновляем в фоне (раунды его всё равно используют)
+FRAME_MANIFEST_REFRESH_INTERVAL = float(os.getenv("FRAME_MANIFEST_REFRESH_INTERVAL", "300"))  # сек между проходами фонового обновления
+FRAME_MANIFEST_REFRESH_BATCH = int(os.getenv("FRAME_MANIFEST_REFRESH_BATCH", "500"))          # фильмов за один проход
+
+# ---------- сборка игр ----------
+GAME_BUILD_CONCURRENCY = int(os.getenv("GAME_BUILD_CONCURRENCY", "16"))  # сколько раундов тянем из tmdb-sync параллельно
+GAME_MAX_ROUNDS = int(os.getenv("GAME_MAX_ROUNDS", "200"))                # потолок total_rounds в запросе на создание игры
+
+# ---------- пул заранее собранных игр ----------
+GAME_POOL_SIZE = int(os.getenv("GAME_POOL_SIZE", "3"))                        # шаблонов на (версия, режим); 0 — пул выключен
+GAME_POOL_REFILL_INTERVAL = float(os.getenv("GAME_POOL_REFILL_INTERVAL", "30"))  # сек между плановыми пополнениями
+GAME_POOL_HOT_WINDOW = int(os.getenv("GAME_POOL_HOT_WINDOW", "3600"))         # сек: версия «популярна», если по ней были игры за это время
+GAME_POOL_MAX_VERSIONS = int(os.getenv("GAME_POOL_MAX_VERSIONS", "20"))       # сколько самых популярных версий держим в пуле
+
+# ---------- компиляция коллекций ----------
+COLLECTION_COMPILE_PAGE_SIZE = int(os.getenv("COLLECTION_COMPILE_PAGE_SIZE", "500"))  # документов в одной странице /movies/search
+COLLECTION_DELTA_MAX_RATIO = float(os.getenv("COLLECTION_DELTA_MAX_RATIO", "0.5"))  # доля изменённых позиций, выше — пишем полный снимок
+LATEST_VERSION_CACHE_TTL = float(os.getenv("LATEST_VERSION_CACHE_TTL", "30"))    # сек: сколько процесс помнит последнюю версию коллекции, если NOTIFY о публикации потерялся
+LATEST_VERSION_CACHE_SIZE = int(os.getenv("LATEST_VERSION_CACHE_SIZE", "10000"))  # коллекций в этом кэше
+COMPILE_WORKERS = int(os.getenv("COMPILE_WORKERS", "2"))                          # компиляций одновременно в процессе; 0 — не разбираем очередь
+COMPILE_POLL_INTERVAL = float(os.getenv("COMPILE_POLL_INTERVAL", "5"))            # сек: как часто заглядываем в очередь без сигнала
+COMPILE_JOB_TIMEOUT = int(os.getenv("COMPILE_JOB_TIMEOUT", "1800"))               # сек: running без heartbeat дольше — воркер умер, задачу берём заново (heartbeat — каждую треть)
+COMPILE_MAX_ATTEMPTS = int(os.getenv("COMPILE_MAX_ATTEMPTS", "3"))                # столько раз берём задачу, потом failed
+
+# ---------- горячее состояние идущих игр ----------
+HOT_STATE_BACKEND = os.getenv("HOT_STATE_BACKEND", "off").strip().lower()   # off|memory (memory — один процесс API на ноду и sticky-балансировка по игре)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))                    # процессов API (её же читают uvicorn/gunicorn); memory при >1 не запустится
+HOT_STATE_STICKY_ROUTING = _env_bool("HOT_STATE_STICKY_ROUTING", "0")       # 1 — подтверждаем: запросы одной игры всегда приходят в один процесс; без этого memory не запустится
+HOT_STATE_MAX_GAMES = int(os.getenv("HOT_STATE_MAX_GAMES", "50000"))        # игр в памяти процесса
+HOT_STATE_TTL = float(os.getenv("HOT_STATE_TTL", "3600"))                   # сек простоя, после которых игра выпадает из памяти
+ANSWER_FLUSH_BATCH = int(os.getenv("ANSWER_FLUSH_BATCH", "500"))            # ответов в одной пачке записи в Postgres
+ANSWER_FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", "0.2"))    # сек: максимум ожидания пачки
+ANSWER_DURABILITY = os.getenv("ANSWER_DURABILITY", "group").strip().lower()  # group — ответ подтверждается после коммита пачки; ack — сразу
+ANSWER_GROUP_COMMIT_DELAY = float(os.getenv("ANSWER_GROUP_COMMIT_DELAY", "0.01"))  # сек: сколько пачка ждёт попутчиков, если кто-то ждёт коммита
+
+# ---------- ответы API ----------
+RESPONSE_COMPRESS_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESS_MIN_SIZE", "1024"))  # байт: ответы меньше не сжимаем
+RESPONSE_COMPRESS_LEVEL = int(os.getenv("RESPONSE_COMPRESS_LEVEL", "5"))          # уровень gzip (1-9): дальше 5 почти только CPU
+
+# ---------- фоновые воркеры (очередь компиляций + пул игр + манифесты кадров) ----------
+BACKGROUND_WORKERS_IN_API = _env_bool("BACKGROUND_WORKERS_IN_API", "0")  # 1 — только для разработки в один процесс; иначе компиляции, пул и манифесты — в python -m app.workers.rounds (раунды запрошенной игры всегда собирает API)
+ROUND_WORKER_PROCESSES = int(os.getenv("ROUND_WORKER_PROCESSES", "2"))  # процессов в python -m app.workers.rounds
+
+
 class Settings(BaseSettings):
     DATABASE_URL: str
     MONGO_URI: str
@@ -0,0 +1,68 @@
+import json
+from typing import Any, AsyncIterable, Iterable
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import RESPONSE_COMPRESS_LEVEL, RESPONSE_COMPRESS_MIN_SIZE
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # orjson не установлен — обычный json, API тот же
+    orjson = None
+    FastJSONResponse = JSONResponse
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli опционален, без него — только gzip
+    BrotliMiddleware = None
+
+
+def json_line(obj: Any) -> bytes:
+    """Одна NDJSON-строка (UTF-8, datetime — в ISO)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str) + b"\n"
+    return (json.dumps(obj, ensure_ascii=False, default=str) + "\n").encode()
+
+
+def ndjson_response(lines: AsyncIterable[bytes], **kwargs: Any) -> StreamingResponse:
+    """NDJSON-поток; сжимать ли его, решает CompressionMiddleware по пути запроса."""
+    return StreamingResponse(lines, media_type="application/x-ndjson", **kwargs)
+
+
+class CompressionMiddleware:
+    """brotli (с откатом на gzip для старых клиентов), если он установлен, иначе gzip.
+
+    Пути из skip_paths идут мимо компрессора: gzip/brotli копят поток
+    в буфере, и строки доходили бы до клиента пачками, а не по мере готовности.
+    """
+
+    def __init__(self, app: ASGIApp, *, skip_paths: Iterable[str] = ()) -> None:
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(
+                app,
+                minimum_size=RESPONSE_COMPRESS_MIN_SIZE,
+                gzip_fallback=True,
+            )
+        else:
+            self.compressed = GZipMiddleware(
+                app,
+                minimum_size=RESPONSE_COMPRESS_MIN_SIZE,
+                compresslevel=RESPONSE_COMPRESS_LEVEL,
+            )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        await self.compressed(scope, receive, send)
+
+
+def add_compression(app: FastAPI, *, skip_paths: Iterable[str] = ()) -> None:
+    """Сжатие ответов; skip_paths — потоковые ручки, которые отдаём как есть."""
+    app.add_middleware(CompressionMiddleware, skip_paths=skip_paths)
@@ -1,19 +1,16 @@
-import httpx
-from app.core.config import TMDB_SYNC_URL
+from app.services.tmdb_sync_client import get_client
 
 
 async def get_movie(tmdb_id: int):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{TMDB_SYNC_URL}/movies/{tmdb_id}")
-        r.raise_for_status()
-        return r.json()
+    r = await get_client().get(f"/movies/{tmdb_id}")
+    r.raise_for_status()
+    return r.json()
 
 
 async def get_frames(tmdb_id: int):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{TMDB_SYNC_URL}/movies/{tmdb_id}/frames")
-        r.raise_for_status()
-        return r.json()["frames"]
+    r = await get_client().get(f"/movies/{tmdb_id}/frames")
+    r.raise_for_status()
+    return r.json()["frames"]
 
 
 async def search_similar(genre_ids, year, _type="movie", limit=80):
@@ -23,7 +20,6 @@ async def search_similar(genre_ids, year, _type="movie", limit=80):
     if year:
         params["year_from"] = max(int(year) - 1, 1900)
         params["year_to"]   = int(year) + 1
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{TMDB_SYNC_URL}/movies/search", params=params)
-        r.raise_for_status()
-        return r.json()["items"]
+    r = await get_client().get("/movies/search", params=params)
+    r.raise_for_status()
+    return r.json()["items"]
@@ -6,9 +6,18 @@ from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.api import collections, game
 # from app.api import sets as sets_api
-from app.core.db import get_pool
+from app.core.config import BACKGROUND_WORKERS_IN_API
+from app.core.db import dispose_engine, raw_connection, wait_for_db
+from app.core.http import add_compression
 from app.core.mongo import mongo_db
 from app.db.sql import DDL
+from app.services.tmdb_sync_client import init_client, close_client, tmdb_cache_stats
+from app.services.game_pool import start_refiller, stop_refiller
+from app.services.compile_jobs import start_compile_workers, stop_compile_workers
+from app.services.frame_manifests import start_frame_refresher, stop_frame_refresher
+from app.services.hot_state import start_hot_state, stop_hot_state, hot_state_stats
+from app.services.titles import title_cache_stats
+from app.services.versions import start_version_listener, stop_version_listener
 
 # from app.api.auth import router as auth_router
 # from app.api.game import router as game_router
@@ -32,7 +41,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After"],  # курсор следующей страницы GET /collections
 )
+# раунды и страницы коллекций — повторяющийся JSON, сжимается в разы
+# /games/stream отдаёт раунды по мере сборки — его не сжимаем
+add_compression(app, skip_paths={"/games/stream"})
 
 # app.include_router(auth.router, prefix="/auth", tags=["auth"])
 # app.include_router(collections.router)
@@ -49,9 +62,29 @@ async def root():
 
 @app.on_event("startup")
 async def startup():
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    await wait_for_db()
+    async with raw_connection() as conn:
         await conn.execute(DDL)
+    await init_client()
+    await start_version_listener()
+    start_hot_state()
+    # очередь компиляций и пул игр можно целиком отдать python -m app.workers.rounds
+    if BACKGROUND_WORKERS_IN_API:
+        start_refiller()
+        start_compile_workers()
+        start_frame_refresher()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_compile_workers()
+    await stop_refiller()
+    await stop_frame_refresher()
+    # дописываем в Postgres ответы, принятые горячим хранилищем
+    await stop_hot_state()
+    await stop_version_listener()
+    await close_client()
+    await dispose_engine()
 
 
 @app.get("/ping-mongo")
@@ -64,6 +97,20 @@ async def ping_mongo():
     return {"collections": collections}
 
 
+@app.get("/tmdb-sync/cache")
+async def tmdb_sync_cache():
+    return tmdb_cache_stats()
+
+
+@app.get("/titles/cache")
+async def titles_cache():
+    return title_cache_stats()
+
+
+@app.get("/hot-state")
+async def hot_state():
+    return hot_state_stats()
+
 
 # app.include_router(auth_router, prefix="/auth")
 # app.include_router(game_router, prefix="/game")
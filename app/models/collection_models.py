@@ -1,7 +1,7 @@
 from typing import Any
 
 from datetime import datetime
-from sqlalchemy import Integer, String, Text, ForeignKey, JSON, UniqueConstraint
+from sqlalchemy import DateTime, Index, Integer, String, Text, ForeignKey, JSON, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.models.base import Base
 
@@ -17,8 +17,16 @@ class Collection(Base):
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
+    # последняя опубликованная версия; ведёт materialize_collection в той же транзакции
+    latest_published_version_id: Mapped[int | None] = mapped_column(
+        ForeignKey("collection_versions.id", ondelete="SET NULL", use_alter=True),
+        nullable=True,
+    )
+
     versions: Mapped[list["CollectionVersion"]] = relationship(
-        back_populates="collection", cascade="all, delete-orphan"
+        back_populates="collection",
+        cascade="all, delete-orphan",
+        foreign_keys="CollectionVersion.collection_id",
     )
 
 
@@ -36,12 +44,30 @@ class CollectionVersion(Base):
     rule_overrides_json: Mapped[dict | None] = mapped_column(JSON, nullable=True)  # доп. изменения к базовому правилу
     status: Mapped[str] = mapped_column(String(20), default="published")  # draft|published|archived
 
-    collection: Mapped["Collection"] = relationship(back_populates="versions")
+    # инкрементальная компиляция: хэш правила + выдачи tmdb-sync и базовый полный снимок.
+    # base_version_id IS NULL — в collection_items лежат все позиции версии,
+    # иначе только позиции, отличающиеся от базы (остальное берём из базы, ord <= size)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    base_version_id: Mapped[int | None] = mapped_column(ForeignKey("collection_versions.id"), nullable=True)
+
+    collection: Mapped["Collection"] = relationship(back_populates="versions", foreign_keys=[collection_id])
     items: Mapped[list["CollectionItem"]] = relationship(
         back_populates="version", cascade="all, delete-orphan"
     )
+    distractor_pools: Mapped[list["CollectionDistractorPool"]] = relationship(
+        back_populates="version", cascade="all, delete-orphan"
+    )
 
-    __table_args__ = (UniqueConstraint("collection_id", "version", name="uq_collection_version"),)
+    __table_args__ = (
+        # заодно покрывает max(version) по коллекции (compute_next_version)
+        UniqueConstraint("collection_id", "version", name="uq_collection_version"),
+        # проверка FK base_version_id при удалении версии
+        Index(
+            "ix_collection_versions_base_version_id",
+            "base_version_id",
+            postgresql_where=text("base_version_id IS NOT NULL"),
+        ),
+    )
 
 
 class CollectionItem(Base):
@@ -51,4 +77,50 @@ class CollectionItem(Base):
     tmdb_id: Mapped[int] = mapped_column(Integer, index=True)
     _type: Mapped[str] = mapped_column(String(10), default="movie")  # movie|tv
 
+    # индекс дистракторов: название для варианта ответа + ключи пулов
+    # (CollectionDistractorPool.key) от самого похожего к самому общему
+    title: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    title_ru: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    pool_keys: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+
     version: Mapped["CollectionVersion"] = relationship(back_populates="items")
+
+
+class CollectionDistractorPool(Base):
+    """Ранжированный пул кандидатов в дистракторы (жанр/десятилетие) для версии."""
+    __tablename__ = "collection_distractor_pools"
+    version_id: Mapped[int] = mapped_column(ForeignKey("collection_versions.id", ondelete="CASCADE"), primary_key=True)
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # movie:g18:d1990 | movie:g18 | movie:d1990 | movie
+    items: Mapped[list[dict]] = mapped_column(JSON)  # [{id,title,title_ru}, ...] по убыванию голосов
+
+    version: Mapped["CollectionVersion"] = relationship(back_populates="distractor_pools")
+
+
+class CompileJob(Base):
+    """Задача на компиляцию коллекции; разбирается воркерами через FOR UPDATE SKIP LOCKED."""
+    __tablename__ = "compile_jobs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    collection_id: Mapped[int] = mapped_column(ForeignKey("collections.id", ondelete="CASCADE"))
+    overrides: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    seed: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    status: Mapped[str] = mapped_column(String(20), default="queued")  # queued|running|done|failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    version_id: Mapped[int | None] = mapped_column(
+        ForeignKey("collection_versions.id", ondelete="SET NULL"), nullable=True
+    )  # результат: новая (или неизменившаяся последняя) версия
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # очередь: claim_job берёт самую старую queued/running
+        Index(
+            "ix_compile_jobs_pending",
+            "id",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+        Index("ix_compile_jobs_collection_id", "collection_id"),
+    )
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import JSON
+
+from app.models.base import Base
+
+
+class FrameManifest(Base):
+    """Кадры фильма из tmdb-sync, сохранённые при компиляции коллекции.
+
+    Раунды выбирают кадры отсюда, не запрашивая /frames на каждую сборку;
+    устаревшие (fetched_at) манифесты обновляет фоновый воркер.
+    """
+    __tablename__ = "frame_manifests"
+
+    tmdb_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    _type: Mapped[str] = mapped_column(String(10), primary_key=True)  # movie|tv
+
+    # пути кадров в порядке tmdb-sync (по качеству); [] — кадров нет
+    paths: Mapped[list[str]] = mapped_column(JSON, nullable=False)
+
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # фоновое обновление: самые старые манифесты первыми
+        Index("ix_frame_manifests_fetched_at", "fetched_at"),
+    )
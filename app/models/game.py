@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import ForeignKey, Integer, String, DateTime, Boolean
+from sqlalchemy import ForeignKey, Index, Integer, String, DateTime, Boolean
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
 
@@ -32,6 +32,10 @@ class Game(Base):
 
     score: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
+    # денормализованные счётчики для /state (ведёт answer_round)
+    answered_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    correct_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime,
         default=datetime.utcnow,
@@ -43,6 +47,12 @@ class Game(Base):
         nullable=True,
     )
 
+    # когда собраны все раунды; None — игра ещё собирается (потоковое создание)
+    built_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime,
+        nullable=True,
+    )
+
     # отношения
     rounds: Mapped[List["GameRound"]] = relationship(
         back_populates="game",
@@ -50,6 +60,11 @@ class Game(Base):
         order_by="GameRound.ord",
     )
 
+    __table_args__ = (
+        # популярные версии для пула игр: WHERE created_at >= :since
+        Index("ix_games_created_at", "created_at"),
+    )
+
 
 class GameRound(Base):
     __tablename__ = "game_rounds"
@@ -69,10 +84,16 @@ class GameRound(Base):
         nullable=False,
     )
 
-    # варианты ответа: [{id,title,title_ru}, ...]
-    options: Mapped[list[dict]] = mapped_column(
+    # варианты ответа: tmdb_id в порядке показа, названия — в titles (по _type раунда)
+    option_ids: Mapped[Optional[list[int]]] = mapped_column(
         JSON,
-        nullable=False,
+        nullable=True,
+    )
+
+    # старый формат вариантов: [{id,title,title_ru}, ...]; у новых раундов NULL
+    options: Mapped[Optional[list[dict]]] = mapped_column(
+        JSON,
+        nullable=True,
     )
 
     correct_index: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -81,3 +102,34 @@ class GameRound(Base):
     answered_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     game: Mapped["Game"] = relationship(back_populates="rounds")
+
+    # answered_index нарочно не индексируем: ответ (UPDATE по PK) остаётся HOT-обновлением
+
+
+class GameTemplate(Base):
+    """Заранее собранный набор раундов для (версия, режим) — пул для быстрого POST /games."""
+    __tablename__ = "game_templates"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    version_id: Mapped[int] = mapped_column(
+        ForeignKey("collection_versions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    mode: Mapped[str] = mapped_column(String(40), nullable=False)
+    seed: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_rounds: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # раунды как в game_rounds: [{correct_tmdb_id,_type,frame_paths,option_ids,correct_index}, ...]
+    rounds: Mapped[list[dict]] = mapped_column(JSON, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.utcnow,
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # выборка шаблона на claim: WHERE version_id AND mode ORDER BY id
+        Index("ix_game_templates_version_mode", "version_id", "mode", "id"),
+    )
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class Title(Base):
+    """Общий словарь названий: варианты ответа в раундах ссылаются сюда по id.
+
+    Пополняется из ответов tmdb-sync при компиляции коллекций и сборке раундов;
+    поправить название — обновить одну строку.
+    """
+    __tablename__ = "titles"
+
+    tmdb_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    _type: Mapped[str] = mapped_column(String(10), primary_key=True)  # movie|tv
+    title: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    title_ru: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # ревизия словаря для ETag раундов: max(updated_at)
+        Index("ix_titles_updated_at", "updated_at"),
+    )
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    ANSWER_DURABILITY,
+    ANSWER_FLUSH_BATCH,
+    ANSWER_FLUSH_INTERVAL,
+    ANSWER_GROUP_COMMIT_DELAY,
+)
+from app.core.db import get_sessionmaker
+from app.services.games import write_answers
+
+
+logger = logging.getLogger(__name__)
+
+
+# гарантии для принятого ответа:
+#   ack   — подтверждаем сразу; при падении процесса теряются ответы последней пачки
+#   group — подтверждаем после коммита пачки с этим ответом (групповой коммит:
+#           один fsync на пачку, а не на ответ)
+DURABILITY_MODES = ("ack", "group")
+
+
+class AnswerWriteBehind:
+    """Копим принятые ответы и пишем их в Postgres пачками (write_answers).
+
+    Пачка уходит, когда набралось max_batch ответов, прошло max_delay
+    секунд с прошлой записи (group_delay, если кто-то ждёт коммита),
+    а также по flush() и при остановке. Упавшая пачка остаётся в очереди
+    и уходит со следующей: запись идемпотентна.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_batch: int = ANSWER_FLUSH_BATCH,
+        max_delay: float = ANSWER_FLUSH_INTERVAL,
+        durability: str = ANSWER_DURABILITY,
+        group_delay: float = ANSWER_GROUP_COMMIT_DELAY,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown answer durability: {durability!r}")
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.durability = durability
+        self.group_delay = group_delay
+        # (ответ, future коммита | None); future — только в режиме group
+        self._pending: list[tuple[dict, asyncio.Future | None]] = []
+        self._wakeup = asyncio.Event()
+        self._wakeup_timer: asyncio.TimerHandle | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, answer: dict) -> asyncio.Future | None:
+        """answer: {game_id, ord, answered_index, is_correct, answered_at}.
+
+        В режиме group возвращает future, который завершится коммитом пачки
+        (или ошибкой записи); в режиме ack — None.
+        """
+        fut = None
+        if self.durability == "group":
+            fut = asyncio.get_running_loop().create_future()
+            if self._wakeup_timer is None:
+                self._wakeup_timer = asyncio.get_running_loop().call_later(
+                    self.group_delay, self._on_group_timer
+                )
+        self._pending.append((answer, fut))
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return fut
+
+    def _on_group_timer(self) -> None:
+        # сработавший таймер забываем: иначе следующий add() его не взведёт,
+        # и ответы после этой пачки ждали бы max_delay вместо group_delay
+        self._wakeup_timer = None
+        self._wakeup.set()
+
+    async def commit(self, answer: dict) -> None:
+        """add + ожидание коммита, если этого требует режим."""
+        fut = self.add(answer)
+        if fut is not None:
+            await asyncio.shield(fut)
+
+    def has_pending(self, game_id: int) -> bool:
+        return any(a["game_id"] == game_id for a, _ in self._pending)
+
+    async def wait_committed(self, game_id: int) -> None:
+        """В режиме group — ждём коммита уже принятых ответов игры.
+
+        Для повтора ответа (ретрай клиента): подтверждаем его не раньше
+        исходного, иначе group на повторе тихо превратился бы в ack.
+        Если у кого-то из ответов нет future (прошлая пачка упала), пишем сами.
+        """
+        if self.durability != "group":
+            return
+        futs = [fut for a, fut in self._pending if a["game_id"] == game_id]
+        if not futs:
+            return
+        if all(fut is not None for fut in futs):
+            await asyncio.gather(*(asyncio.shield(fut) for fut in futs))
+        else:
+            await self.flush()
+
+    def flush_soon(self) -> None:
+        """Не ждать max_delay (например, игра только что закончилась)."""
+        self._wakeup.set()
+
+    async def _write(self, answers: list[dict], session: AsyncSession | None = None) -> None:
+        if session is None:
+            SessionLocal = get_sessionmaker()
+            async with SessionLocal() as session:
+                await self._write(answers, session)
+            return
+        try:
+            await write_answers(session, answers)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+    async def flush(self, session: AsyncSession | None = None) -> None:
+        """Пишем всё накопленное. session — сессия вызывающего (коммитится),
+        чтобы не брать второе соединение, пока он держит своё; иначе — своя."""
+        async with self._lock:
+            if self._wakeup_timer is not None:
+                self._wakeup_timer.cancel()
+                self._wakeup_timer = None
+            while self._pending:
+                batch = self._pending[: self.max_batch]
+                try:
+                    await self._write([a for a, _ in batch], session)
+                except Exception as e:
+                    self.failures += 1
+                    # ждущим — ошибка; сами ответы остаются в очереди до следующей попытки
+                    for i, (answer, fut) in enumerate(batch):
+                        if fut is not None:
+                            if not fut.done():
+                                fut.set_exception(e)
+                                fut.exception()  # ждущий мог уже уйти (отмена запроса)
+                            self._pending[i] = (answer, None)
+                    raise
+                del self._pending[: len(batch)]
+                self.flushed += len(batch)
+                self.batches += 1
+                for _, fut in batch:
+                    if fut is not None and not fut.done():
+                        fut.set_result(None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Answer flush failed, %d answers pending", len(self._pending))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливаем фоновую запись и дописываем всё, что накопилось."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Final answer flush failed, %d answers lost", len(self._pending))
+
+    def stats(self) -> dict:
+        return {
+            "durability": self.durability,
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+        }
@@ -1,9 +1,18 @@
 from __future__ import annotations
 from typing import Any, Dict, Optional
-from sqlalchemy import delete, select, func
+from sqlalchemy import insert, select, func, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.collection_models import Collection, CollectionVersion, CollectionItem
-from app.services.tmdb_sync_client import search_movies
+from app.core.config import COLLECTION_DELTA_MAX_RATIO, COLLECTION_COMPILE_PAGE_SIZE
+from app.core.db import copy_records
+from app.models.collection_models import Collection, CollectionVersion, CollectionItem, CollectionDistractorPool
+from app.services.tmdb_sync_client import iter_search_pages
+from app.services.round_builder import distractor_pool_filters, load_distractor_pools
+from app.services.game_pool import invalidate_collection
+from app.services.frame_manifests import ensure_frame_manifests
+from app.services.titles import remember_titles
+from app.services.versions import invalidate_latest_version, notify_published
+import hashlib
+import json
 import math
 
 
@@ -61,12 +70,14 @@ def merge_rules(base: dict, overrides: dict | None) -> dict:
     return out
 
 
-async def compute_next_version(session: AsyncSession, collection_id: int) -> int:
-    row = await session.execute(
-        select(func.max(CollectionVersion.version)).where(
-            CollectionVersion.collection_id == collection_id
-        )
+def _max_version_query(collection_id: int):
+    return select(func.max(CollectionVersion.version)).where(
+        CollectionVersion.collection_id == collection_id
     )
+
+
+async def compute_next_version(session: AsyncSession, collection_id: int) -> int:
+    row = await session.execute(_max_version_query(collection_id))
     v = row.scalar_one_or_none()
     return 1 if v is None else v + 1
 
@@ -79,7 +90,8 @@ async def materialize_collection(
 ) -> int:
     """
     Создаём новую версию коллекции и наполняем collection_items.
-    Возвращаем PK версии (CollectionVersion.id).
+    Возвращаем PK версии (CollectionVersion.id); если правило и выдача
+    не изменились — PK последней версии, новая не создаётся.
     """
 
     # 1. Базовое правило: из коллекции или дефолт
@@ -131,65 +143,189 @@ async def materialize_collection(
     sort_by = sort.get("by") or "vote_count"
     order = sort.get("order") or "desc"
 
-    # 2. Дёргаем tmdb-sync /movies/search
-    resp = await search_movies(
-        _type=type_,
-        genre_id=genre_id,
-        country_code=country,
-        year_from=year_from,
-        year_to=year_to,
-        is_animated=is_animated,
-        sort_by=sort_by,
-        order=order,
-        limit=limit,
-        skip=0,
-    )
+    collection_id = collection.id  # после rollback объект протухнет
 
-    # tmdb-sync отдаёт {"items": [...]}
-    raw_items = resp.get("items") if isinstance(resp, dict) else resp
-    movies = raw_items or []
-    size = len(movies)
+    # 2. Предыдущая версия и её полный снимок — база для дельты
+    prev = await _latest_version(session, collection_id)
+    prev_id = prev.id if prev is not None else None
+    prev_hash = prev.content_hash if prev is not None else None
+    base_id = (prev.base_version_id or prev.id) if prev is not None else None
 
     # 3. Номер логической версии
-    next_version = await compute_next_version(session, collection.id)
+    next_version = await compute_next_version(session, collection_id)
 
-    # 4. Создаём запись версии
+    # 4. Создаём черновик версии: items пишем по мере прихода страниц
     version = CollectionVersion(
-        collection_id=collection.id,
+        collection_id=collection_id,
         version=next_version,
-        size=size,
+        size=0,
         seed=seed,
         # сохраняем фактически использованное правило,
         # чтобы потом было понятно, по чему собрали
         rule=rule,
         rule_overrides_json=overrides or {},
-        status="published",
+        status="draft",
     )
     session.add(version)
     await session.flush()  # нужен version.id (PK)
 
-    # 5. На всякий случай чистим items для этой версии
-    await session.execute(
-        delete(CollectionItem).where(CollectionItem.version_id == version.id)
-    )
+    # 5. Постранично тянем tmdb-sync /movies/search и сразу пишем страницу в БД:
+    # в памяти не больше двух страниц, сколько бы ни было в коллекции
+    hasher = _content_hasher(rule, seed)
+    pool_filters: Dict[str, Dict[str, Any]] = {}
+    size = 0
+    changed = 0
+    async for page in iter_search_pages(
+        limit=limit,
+        page_size=COLLECTION_COMPILE_PAGE_SIZE,
+        _type=type_,
+        genre_id=genre_id,
+        country_code=country,
+        year_from=year_from,
+        year_to=year_to,
+        is_animated=is_animated,
+        sort_by=sort_by,
+        order=order,
+    ):
+        rows = []
+        for idx, m in enumerate(page, start=size + 1):
+            doc_filters = distractor_pool_filters(m, _type=type_)
+            for key, flt in doc_filters.items():
+                pool_filters.setdefault(key, flt)
+            row = (m["id"], type_, m.get("title") or m.get("name"), m.get("title_ru"), list(doc_filters))
+            hasher.update(_hash_line(row))
+            rows.append((idx, row))
+
+        # словарь названий для вариантов ответа в раундах
+        await remember_titles(
+            session,
+            type_,
+            ({"id": row[0], "title": row[2], "title_ru": row[3]} for _, row in rows),
+        )
 
-    # 6. Наполняем items, если есть фильмы
-    items_to_add: list[CollectionItem] = []
-    for idx, m in enumerate(movies, start=1):
-        ci = CollectionItem(
-            version_id=version.id,  # ВАЖНО: именно PK версии
-            ord=idx,
-            tmdb_id=m["id"],
-            _type=type_,
+        # манифесты кадров: раунды потом выбирают кадры из них, без /frames
+        await ensure_frame_manifests(session, [m["id"] for m in page], type_)
+
+        # дельта: пишем только позиции, отличающиеся от базового снимка
+        if base_id is not None:
+            base = await _base_rows(session, base_id, rows[0][0], rows[-1][0])
+            rows = [(idx, row) for idx, row in rows if base.get(idx) != row]
+
+        if rows:
+            await copy_records(
+                session,
+                "collection_items",
+                ["version_id", "ord", "tmdb_id", "_type", "title", "title_ru", "pool_keys"],
+                (
+                    # ВАЖНО: именно PK версии
+                    (version.id, idx, tmdb_id, _type, title, title_ru, json.dumps(keys))
+                    for idx, (tmdb_id, _type, title, title_ru, keys) in rows
+                ),
+            )
+        changed += len(rows)
+        size += len(page)
+
+    # 5.1 Ничего не поменялось (ни правило, ни выдача) — новую версию не плодим
+    content_hash = hasher.hexdigest()
+    if prev_id is not None and prev_hash == content_hash:
+        await session.rollback()
+        return prev_id
+
+    # 5.2 Изменилась слишком большая доля позиций — дописываем остальные
+    # из базы и делаем версию полным снимком
+    if base_id is not None and changed > COLLECTION_DELTA_MAX_RATIO * size:
+        await session.execute(
+            text(_FILL_SNAPSHOT_SQL),
+            {"version_id": version.id, "base_id": base_id, "size": size},
         )
-        items_to_add.append(ci)
+        base_id = None
+
+    # 6. Индекс дистракторов: пулы по жанру/десятилетию, чтобы при создании
+    # игры не ходить в tmdb-sync за вариантами ответа на каждый раунд
+    pools = await load_distractor_pools(pool_filters, _type=type_)
+    if pools:
+        await remember_titles(session, type_, (o for pool_items in pools.values() for o in pool_items))
+        await session.execute(
+            insert(CollectionDistractorPool),
+            [
+                {"version_id": version.id, "key": key, "items": pool_items}
+                for key, pool_items in pools.items()
+            ],
+        )
+
+    version.size = size
+    version.content_hash = content_hash
+    version.base_version_id = base_id
+    version.status = "published"
 
-    if items_to_add:
-        session.add_all(items_to_add)
+    # указатель на последнюю версию меняется в той же транзакции, что и публикация
+    await session.execute(
+        update(Collection)
+        .where(Collection.id == collection_id)
+        .values(latest_published_version_id=version.id)
+    )
 
-    # на всякий случай синхронизируем size с фактическим количеством
-    version.size = len(items_to_add)
+    # готовые игры старых версий больше не раздаём
+    await invalidate_collection(session, collection_id, keep_version_id=version.id)
+    await notify_published(session, collection_id)
 
     await session.commit()
-    await session.refresh(version)
+    invalidate_latest_version(collection_id)
     return version.id
+
+
+# позиции базы, которых нет среди изменённых, — в полный снимок
+_FILL_SNAPSHOT_SQL = """
+INSERT INTO collection_items (version_id, ord, tmdb_id, _type, title, title_ru, pool_keys)
+SELECT :version_id, b.ord, b.tmdb_id, b._type, b.title, b.title_ru, b.pool_keys
+FROM collection_items b
+WHERE b.version_id = :base_id
+  AND b.ord <= :size
+  AND NOT EXISTS (
+    SELECT 1 FROM collection_items d WHERE d.version_id = :version_id AND d.ord = b.ord
+  )
+"""
+
+
+def _content_hasher(rule: Dict[str, Any], seed: Optional[int]):
+    """sha256 правила и выдачи; строки items докидываются по одной (_hash_line)."""
+    header = json.dumps({"rule": rule, "seed": seed}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(header.encode())
+
+
+def _hash_line(row: tuple) -> bytes:
+    return b"\n" + json.dumps(row, ensure_ascii=False, default=str).encode()
+
+
+async def _latest_version(session: AsyncSession, collection_id: int) -> CollectionVersion | None:
+    return await session.scalar(
+        select(CollectionVersion)
+        .join(Collection, Collection.latest_published_version_id == CollectionVersion.id)
+        .where(Collection.id == collection_id)
+    )
+
+
+async def _base_rows(session: AsyncSession, base_id: int, lo: int, hi: int) -> dict[int, tuple]:
+    """Позиции lo..hi полного снимка base_id в том же виде, что строки новой версии.
+
+    Дельта всегда считается от полного снимка, на который опирается
+    предыдущая версия (или от неё самой, если она полная), — цепочек
+    дельт не бывает, читателю хватает одного DISTINCT ON по двум версиям.
+    Добавленные, удалённые и переставленные фильмы сводятся к изменённым
+    позициям и обрезке хвоста по size.
+    """
+    rows = await session.execute(
+        select(
+            CollectionItem.ord,
+            CollectionItem.tmdb_id,
+            CollectionItem._type,
+            CollectionItem.title,
+            CollectionItem.title_ru,
+            CollectionItem.pool_keys,
+        )
+        .where(
+            CollectionItem.version_id == base_id,
+            CollectionItem.ord.between(lo, hi),
+        )
+    )
+    return {r.ord: (r.tmdb_id, r._type, r.title, r.title_ru, r.pool_keys) for r in rows}
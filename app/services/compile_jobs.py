@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    COMPILE_WORKERS,
+    COMPILE_POLL_INTERVAL,
+    COMPILE_JOB_TIMEOUT,
+    COMPILE_MAX_ATTEMPTS,
+)
+from app.core.db import get_sessionmaker
+from app.models.collection_models import Collection, CompileJob
+from app.services.collections import materialize_collection
+
+
+logger = logging.getLogger(__name__)
+
+
+_jobs_event: asyncio.Event | None = None
+_worker_tasks: list[asyncio.Task] = []
+
+
+def _event() -> asyncio.Event:
+    global _jobs_event
+    if _jobs_event is None:
+        _jobs_event = asyncio.Event()
+    return _jobs_event
+
+
+# канал LISTEN/NOTIFY: будим воркеры в отдельных процессах (app.workers.rounds)
+COMPILE_CHANNEL = "compile_jobs"
+
+
+# класс pg advisory lock-ов компиляции: (класс, collection_id)
+_COMPILE_LOCK_CLASS = 7302
+
+
+def wake_workers() -> None:
+    """Будим воркеры этого процесса, не дожидаясь COMPILE_POLL_INTERVAL."""
+    _event().set()
+
+
+async def enqueue_compile(
+    session: AsyncSession,
+    collection_id: int,
+    overrides: Optional[Dict[str, Any]] = None,
+    seed: Optional[int] = None,
+) -> CompileJob:
+    """Ставим компиляцию в очередь (compile_jobs) и сразу коммитим."""
+    job = CompileJob(
+        collection_id=collection_id,
+        overrides=overrides,
+        seed=seed,
+        status="queued",
+        attempts=0,
+        created_at=datetime.utcnow(),
+    )
+    session.add(job)
+    # NOTIFY уйдёт воркерам в других процессах вместе с коммитом
+    await session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": COMPILE_CHANNEL})
+    await session.commit()
+    wake_workers()
+    return job
+
+
+def _claim_job_query(now: datetime, stale: datetime):
+    oldest = (
+        select(CompileJob.id)
+        .where(
+            or_(
+                CompileJob.status == "queued",
+                (CompileJob.status == "running") & (CompileJob.started_at < stale),
+            )
+        )
+        .order_by(CompileJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(CompileJob)
+        .where(CompileJob.id == oldest)
+        .values(status="running", started_at=now, attempts=CompileJob.attempts + 1)
+        .returning(CompileJob.id)
+    )
+
+
+async def claim_job(session: AsyncSession) -> int | None:
+    """Берём самую старую задачу из очереди; None — очередь пуста.
+
+    SKIP LOCKED: воркеры (в том числе в других процессах) разбирают разные
+    задачи, не ожидая друг друга. running дольше COMPILE_JOB_TIMEOUT считаем
+    брошенной упавшим воркером и берём заново, пока не кончатся попытки.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=COMPILE_JOB_TIMEOUT)
+
+    await session.execute(
+        update(CompileJob)
+        .where(
+            CompileJob.status == "running",
+            CompileJob.started_at < stale,
+            CompileJob.attempts >= COMPILE_MAX_ATTEMPTS,
+        )
+        .values(status="failed", error="worker lost", finished_at=now)
+    )
+
+    job_id = await session.scalar(_claim_job_query(now, stale))
+    await session.commit()
+    return job_id
+
+
+async def _finish(job_id: int, **values: Any) -> None:
+    SessionLocal = get_sessionmaker()
+    async with SessionLocal() as session:
+        await session.execute(
+            update(CompileJob)
+            .where(CompileJob.id == job_id)
+            .values(finished_at=datetime.utcnow(), **values)
+        )
+        await session.commit()
+
+
+async def _heartbeat(job_id: int) -> None:
+    """Пока задача компилируется, обновляем started_at: долгую компиляцию
+    не должны принять за брошенную (claim_job, COMPILE_JOB_TIMEOUT)."""
+    SessionLocal = get_sessionmaker()
+    interval = max(1.0, COMPILE_JOB_TIMEOUT / 3)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as session:
+                await session.execute(
+                    update(CompileJob)
+                    .where(CompileJob.id == job_id, CompileJob.status == "running")
+                    .values(started_at=datetime.utcnow())
+                )
+                await session.commit()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Compile job %s heartbeat failed", job_id)
+
+
+async def run_job(job_id: int) -> None:
+    """Компилируем коллекцию по задаче и записываем результат в compile_jobs."""
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _run_job(job_id)
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+
+
+async def _run_job(job_id: int) -> None:
+    SessionLocal = get_sessionmaker()
+    try:
+        async with SessionLocal() as session:
+            job = await session.get(CompileJob, job_id)
+            if job is None:
+                return
+            overrides, seed = job.overrides, job.seed
+
+            # компиляции одной коллекции — строго по очереди (иначе гонка за номер версии).
+            # Advisory lock, а не FOR UPDATE строки collections: та блокирует
+            # вставки в compile_jobs по внешнему ключу (enqueue_compile) на всё
+            # время компиляции. Отпускается коммитом materialize_collection.
+            await session.execute(
+                select(func.pg_advisory_xact_lock(_COMPILE_LOCK_CLASS, job.collection_id))
+            )
+            collection = await session.get(Collection, job.collection_id)
+            if collection is None:
+                await session.rollback()
+                await _finish(job_id, status="failed", error="collection not found")
+                return
+
+            version_id = await materialize_collection(session, collection, overrides=overrides, seed=seed)
+    except asyncio.CancelledError:
+        # останавливаемся — отдаём задачу обратно в очередь
+        await asyncio.shield(_finish(job_id, status="queued", started_at=None, finished_at=None))
+        raise
+    except Exception as e:
+        logger.exception("Compile job %s failed", job_id)
+        await _finish(job_id, status="failed", error=f"{type(e).__name__}: {e}"[:2000])
+        return
+
+    await _finish(job_id, status="done", version_id=version_id, error=None)
+
+
+async def run_worker() -> None:
+    """Цикл воркера: берём задачу, компилируем, повторяем; в простое ждём сигнала или таймера."""
+    SessionLocal = get_sessionmaker()
+    event = _event()
+    while True:
+        try:
+            async with SessionLocal() as session:
+                job_id = await claim_job(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Compile queue claim failed")
+            job_id = None
+
+        if job_id is None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=COMPILE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+            continue
+
+        await run_job(job_id)
+
+
+def start_compile_workers() -> None:
+    if _worker_tasks:
+        return
+    for _ in range(max(0, COMPILE_WORKERS)):
+        _worker_tasks.append(asyncio.create_task(run_worker()))
+
+
+async def stop_compile_workers() -> None:
+    tasks = list(_worker_tasks)
+    _worker_tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
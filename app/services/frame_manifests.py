@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    FRAME_MANIFEST_TTL,
+    FRAME_MANIFEST_REFRESH_INTERVAL,
+    FRAME_MANIFEST_REFRESH_BATCH,
+)
+from app.core.db import get_sessionmaker
+from app.models.frame_manifest import FrameManifest
+from app.services.tmdb_sync_client import get_frames_bulk
+
+
+logger = logging.getLogger(__name__)
+
+
+ManifestKey = Tuple[int, str]  # (tmdb_id, _type)
+
+_refresh_task: asyncio.Task | None = None
+
+
+def manifest_paths(frames: List[Dict[str, Any]]) -> List[str]:
+    """Манифест из ответа /frames: только пути кадров, в том же порядке."""
+    return [f["path"] for f in frames if f.get("path")]
+
+
+async def fetch_frame_manifests(ids: Sequence[int], _type: str) -> Dict[int, List[str]]:
+    """Манифесты из tmdb-sync пакетно — только для id, которые есть в ответе.
+
+    Фильм без кадров получает []; id, которого tmdb-sync не вернул (неизвестен
+    или сбой), в результат не попадает: сохранённый манифест так не затереть.
+    """
+    frames = await get_frames_bulk(ids, _type=_type)
+    return {tmdb_id: manifest_paths(frames[tmdb_id] or []) for tmdb_id in ids if tmdb_id in frames}
+
+
+async def store_frame_manifests(
+    session: AsyncSession,
+    _type: str,
+    manifests: Dict[int, List[str]],
+) -> None:
+    """Upsert манифестов с fetched_at = сейчас; коммит — на вызывающей стороне."""
+    if not manifests:
+        return
+    now = datetime.utcnow()
+    stmt = insert(FrameManifest)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FrameManifest.tmdb_id, FrameManifest._type],
+            set_={"paths": stmt.excluded.paths, "fetched_at": stmt.excluded.fetched_at},
+        ),
+        # в одном порядке ключей: параллельные записи не ловят взаимную блокировку
+        [
+            {"tmdb_id": tmdb_id, "_type": _type, "paths": paths, "fetched_at": now}
+            for tmdb_id, paths in sorted(manifests.items())
+        ],
+    )
+
+
+async def ensure_frame_manifests(
+    session: AsyncSession,
+    ids: Sequence[int],
+    _type: str,
+) -> Dict[int, List[str]]:
+    """Загружаем и сохраняем манифесты фильмов, у которых их ещё нет.
+
+    В сессии вызывающего, без вложенных сессий; коммит — на вызывающей
+    стороне. Возвращает только новые манифесты.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    have = set(
+        (
+            await session.scalars(
+                select(FrameManifest.tmdb_id).where(
+                    FrameManifest._type == _type,
+                    FrameManifest.tmdb_id.in_(ids),
+                )
+            )
+        ).all()
+    )
+    missing = [tmdb_id for tmdb_id in ids if tmdb_id not in have]
+    if not missing:
+        return {}
+
+    manifests = await fetch_frame_manifests(missing, _type)
+    await store_frame_manifests(session, _type, manifests)
+    return manifests
+
+
+async def get_frame_manifests(session: AsyncSession, items: Sequence[Any]) -> Dict[ManifestKey, List[str]]:
+    """{(tmdb_id, _type): пути кадров} для элементов коллекции.
+
+    Сохранённые — одним запросом, без проверки свежести (это дело фонового
+    обновления); недостающих (версии, собранные до манифестов) — из tmdb-sync
+    с сохранением в той же сессии (коммит — на вызывающей стороне).
+    """
+    keys = {(item.tmdb_id, item._type or "movie") for item in items}
+    if not keys:
+        return {}
+    rows = await session.execute(
+        select(FrameManifest.tmdb_id, FrameManifest._type, FrameManifest.paths)
+        .where(tuple_(FrameManifest.tmdb_id, FrameManifest._type).in_(list(keys)))
+    )
+    out: Dict[ManifestKey, List[str]] = {(tmdb_id, _type): paths for tmdb_id, _type, paths in rows}
+
+    missing_by_type: Dict[str, List[int]] = {}
+    for tmdb_id, _type in keys - out.keys():
+        missing_by_type.setdefault(_type, []).append(tmdb_id)
+    for _type, ids in missing_by_type.items():
+        for tmdb_id, paths in (await ensure_frame_manifests(session, ids, _type)).items():
+            out[(tmdb_id, _type)] = paths
+    return out
+
+
+def _claim_stale_query(now: datetime, stale: datetime, limit: int):
+    oldest = (
+        select(FrameManifest.tmdb_id, FrameManifest._type)
+        .where(FrameManifest.fetched_at < stale)
+        .order_by(FrameManifest.fetched_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(FrameManifest)
+        .where(tuple_(FrameManifest.tmdb_id, FrameManifest._type).in_(oldest))
+        .values(fetched_at=now)
+        .returning(FrameManifest.tmdb_id, FrameManifest._type)
+    )
+
+
+async def refresh_once(limit: int = FRAME_MANIFEST_REFRESH_BATCH) -> int:
+    """Обновляем до limit самых старых манифестов старше FRAME_MANIFEST_TTL.
+
+    Манифесты сначала «забираем» (fetched_at = сейчас, SKIP LOCKED), потом
+    идём в tmdb-sync: параллельные процессы берут разные манифесты, и
+    строки не заблокированы на время запроса. Если запрос упал или tmdb-sync
+    не вернул фильм, прежний манифест остаётся и обновится через TTL.
+    Возвращает число обновлённых манифестов.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=FRAME_MANIFEST_TTL)
+    SessionLocal = get_sessionmaker()
+    async with SessionLocal() as session:
+        rows = (await session.execute(_claim_stale_query(now, stale, limit))).all()
+        await session.commit()
+
+    by_type: Dict[str, List[int]] = {}
+    for tmdb_id, _type in rows:
+        by_type.setdefault(_type, []).append(tmdb_id)
+
+    refreshed = 0
+    for _type, ids in by_type.items():
+        manifests = await fetch_frame_manifests(ids, _type)
+        async with SessionLocal() as session:
+            await store_frame_manifests(session, _type, manifests)
+            await session.commit()
+        refreshed += len(manifests)
+    return refreshed
+
+
+async def run_refresher() -> None:
+    """Фоновый цикл: обновляем устаревшие манифесты, пока они есть, потом ждём интервал."""
+    while True:
+        try:
+            refreshed = await refresh_once()
+            if refreshed:
+                logger.info("Frame manifests: refreshed %d", refreshed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Frame manifest refresh failed")
+            refreshed = 0
+        if refreshed < FRAME_MANIFEST_REFRESH_BATCH:
+            await asyncio.sleep(FRAME_MANIFEST_REFRESH_INTERVAL)
+
+
+def start_frame_refresher() -> None:
+    global _refresh_task
+    if FRAME_MANIFEST_REFRESH_INTERVAL <= 0 or _refresh_task is not None:
+        return
+    _refresh_task = asyncio.create_task(run_refresher())
+
+
+async def stop_frame_refresher() -> None:
+    global _refresh_task
+    if _refresh_task is None:
+        return
+    _refresh_task.cancel()
+    try:
+        await _refresh_task
+    except asyncio.CancelledError:
+        pass
+    _refresh_task = None
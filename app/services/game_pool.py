@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import Select, delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    GAME_POOL_SIZE,
+    GAME_POOL_REFILL_INTERVAL,
+    GAME_POOL_HOT_WINDOW,
+    GAME_POOL_MAX_VERSIONS,
+)
+from app.core.db import get_sessionmaker
+from app.models.collection_models import Collection, CollectionVersion
+from app.models.game import Game, GameTemplate
+from app.services.games import add_rounds, build_round_specs, compact_round_specs
+
+
+logger = logging.getLogger(__name__)
+
+
+_refill_event: asyncio.Event | None = None
+_refill_task: asyncio.Task | None = None
+
+
+def _event() -> asyncio.Event:
+    global _refill_event
+    if _refill_event is None:
+        _refill_event = asyncio.Event()
+    return _refill_event
+
+
+# канал LISTEN/NOTIFY: будим пополнение в отдельных процессах (app.workers.rounds)
+REFILL_CHANNEL = "game_pool_refill"
+
+# класс pg advisory lock-ов пополнения: (класс, version_id)
+_REFILL_LOCK_CLASS = 7301
+
+
+def request_refill() -> None:
+    """Будим фоновое пополнение пула, не дожидаясь планового интервала."""
+    _event().set()
+
+
+async def notify_refill(session: AsyncSession) -> None:
+    """request_refill для всех процессов: NOTIFY уйдёт с коммитом транзакции сессии."""
+    request_refill()
+    await session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": REFILL_CHANNEL})
+
+
+def _claim_template_query(version_id: int, mode: str):
+    oldest = (
+        select(GameTemplate.id)
+        .where(GameTemplate.version_id == version_id, GameTemplate.mode == mode)
+        .order_by(GameTemplate.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return delete(GameTemplate).where(GameTemplate.id == oldest).returning(GameTemplate)
+
+
+async def claim_template(
+    session: AsyncSession,
+    *,
+    version_id: int,
+    mode: str,
+) -> GameTemplate | None:
+    """Атомарно забираем (удаляем) самый старый шаблон для (версия, режим).
+
+    SKIP LOCKED: параллельные запросы разбирают разные шаблоны, не ожидая друг друга.
+    """
+    row = await session.execute(_claim_template_query(version_id, mode))
+    return row.scalar_one_or_none()
+
+
+async def create_game_from_pool(
+    session: AsyncSession,
+    *,
+    version_id: int,
+    mode: str,
+) -> Game | None:
+    """Игра из заранее собранного шаблона — одна транзакция, без сборки раундов.
+
+    None — если пул для (версия, режим) пуст или выключен.
+    """
+    if GAME_POOL_SIZE <= 0:
+        return None
+
+    template = await claim_template(session, version_id=version_id, mode=mode)
+    if template is None:
+        await notify_refill(session)
+        return None
+
+    game = Game(
+        version_id=version_id,
+        mode=mode,
+        total_rounds=template.total_rounds,
+        seed=template.seed,
+        score=0,
+        created_at=datetime.utcnow(),
+        finished_at=None,
+        built_at=datetime.utcnow(),
+    )
+    session.add(game)
+    await session.flush()  # чтобы появился game.id
+
+    await add_rounds(session, game.id, template.rounds)
+    await notify_refill(session)
+    await session.commit()
+    await session.refresh(game)
+    return game
+
+
+async def invalidate_collection(session: AsyncSession, collection_id: int, keep_version_id: int) -> None:
+    """Выкидываем шаблоны старых версий коллекции (после компиляции новой).
+
+    Коммит — на вызывающей стороне.
+    """
+    await session.execute(
+        delete(GameTemplate).where(
+            GameTemplate.version_id.in_(
+                select(CollectionVersion.id).where(
+                    CollectionVersion.collection_id == collection_id,
+                    CollectionVersion.id != keep_version_id,
+                )
+            )
+        )
+    )
+
+
+def _hot_targets_query(since: datetime) -> Select:
+    return (
+        select(Game.version_id, Game.mode)
+        .join(Collection, Collection.latest_published_version_id == Game.version_id)
+        .where(Game.created_at >= since)
+        .group_by(Game.version_id, Game.mode)
+        .order_by(func.count().desc())
+        .limit(GAME_POOL_MAX_VERSIONS)
+    )
+
+
+async def _hot_targets(session: AsyncSession) -> list[tuple[int, str]]:
+    """(версия, режим), по которым недавно создавались игры.
+
+    Только последние опубликованные версии коллекций: старые версии
+    в пул не попадают, даже если по ним ещё играют.
+    """
+    since = datetime.utcnow() - timedelta(seconds=GAME_POOL_HOT_WINDOW)
+    rows = await session.execute(_hot_targets_query(since))
+    return [(r.version_id, r.mode) for r in rows]
+
+
+async def _pool_count(session: AsyncSession, version_id: int, mode: str) -> int:
+    return await session.scalar(
+        select(func.count())
+        .select_from(GameTemplate)
+        .where(GameTemplate.version_id == version_id, GameTemplate.mode == mode)
+    )
+
+
+async def _build_templates(version_id: int, mode: str, count: int) -> list[tuple[int, list[dict]]]:
+    """Собираем до count наборов раундов (seed, specs) — без блокировок и без записи."""
+    SessionLocal = get_sessionmaker()
+    sysrand = random.SystemRandom()
+    out: list[tuple[int, list[dict]]] = []
+    for _ in range(count):
+        seed = sysrand.randrange(2**31)
+        try:
+            async with SessionLocal() as session:
+                specs = await build_round_specs(
+                    session, version_id=version_id, mode=mode, total_rounds=None, seed=seed
+                )
+        except ValueError:
+            # версию удалили/опустела — пропускаем
+            break
+        if not specs:
+            break
+        out.append((seed, specs))
+    return out
+
+
+async def refill_once() -> int:
+    """Добираем пул до GAME_POOL_SIZE шаблонов для каждой популярной версии.
+
+    Раунды собираем до блокировки (это запросы в tmdb-sync), а advisory lock
+    версии берём только на короткую транзакцию вставки: пересчитываем
+    шаблоны и пишем не больше недостающих. Если несколько процессов собрали
+    одно и то же, лишнее просто выбрасывается. Возвращает число записанных
+    шаблонов.
+    """
+    SessionLocal = get_sessionmaker()
+    async with SessionLocal() as session:
+        targets = await _hot_targets(session)
+        need = {
+            (version_id, mode): GAME_POOL_SIZE - await _pool_count(session, version_id, mode)
+            for version_id, mode in targets
+        }
+
+    built = 0
+    for (version_id, mode), count in need.items():
+        if count <= 0:
+            continue
+        templates = await _build_templates(version_id, mode, count)
+        if not templates:
+            continue
+        async with SessionLocal() as session:
+            locked = await session.scalar(
+                select(func.pg_try_advisory_xact_lock(_REFILL_LOCK_CLASS, version_id))
+            )
+            if not locked:
+                # версию сейчас пишет другой процесс — он и доберёт пул
+                continue
+            have = await _pool_count(session, version_id, mode)
+            for seed, specs in templates[:max(0, GAME_POOL_SIZE - have)]:
+                session.add(
+                    GameTemplate(
+                        version_id=version_id,
+                        mode=mode,
+                        seed=seed,
+                        total_rounds=len(specs),
+                        # в шаблоне — только option_ids, названия уходят в titles
+                        rounds=await compact_round_specs(session, specs),
+                        created_at=datetime.utcnow(),
+                    )
+                )
+                built += 1
+            # коммит отпускает и advisory lock
+            await session.commit()
+    return built
+
+
+async def run_refiller() -> None:
+    """Фоновый цикл: пополняем пул по таймеру или по request_refill()."""
+    event = _event()
+    while True:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=GAME_POOL_REFILL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+        try:
+            built = await refill_once()
+            if built:
+                logger.info("Game pool: built %d templates", built)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Game pool refill failed")
+
+
+def start_refiller() -> None:
+    global _refill_task
+    if GAME_POOL_SIZE <= 0 or _refill_task is not None:
+        return
+    _refill_task = asyncio.create_task(run_refiller())
+
+
+async def stop_refiller() -> None:
+    global _refill_task
+    if _refill_task is None:
+        return
+    _refill_task.cancel()
+    try:
+        await _refill_task
+    except asyncio.CancelledError:
+        pass
+    _refill_task = None
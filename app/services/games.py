@@ -1,18 +1,33 @@
 # app/services/games.py
 from __future__ import annotations
 
-from typing import Optional, List
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, List
+import asyncio
+import logging
 import random
 import time
 from datetime import datetime
 
-from sqlalchemy import select, func
+from sqlalchemy import JSON, case, insert, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.collection_models import CollectionVersion, CollectionItem
+from app.core.config import GAME_MAX_ROUNDS
+from app.core.db import get_sessionmaker
+
+from app.models.collection_models import CollectionVersion, CollectionItem, CollectionDistractorPool
 from app.models.game import Game, GameRound
-from app.services.tmdb_sync_client import get_movie
-from app.services.round_builder import pick_frame_paths, choose_distractors, build_options
+from app.services.frame_manifests import get_frame_manifests
+from app.services.round_builder import iter_round_specs
+from app.services.titles import remember_titles, resolve_round_options
+from app.services.versions import version_items_query
+
+
+logger = logging.getLogger(__name__)
+
+
+# фоновые сборки потоковых игр (держим ссылки, чтобы задачи не собрал GC)
+_background_builds: set[asyncio.Task] = set()
 
 
 class AnswerError(Exception):
@@ -20,14 +35,14 @@ class AnswerError(Exception):
     pass
 
 
-async def create_game_from_collection(
+async def _plan_rounds(
     session: AsyncSession,
     *,
     version_id: int,
-    mode: str = "ONE_FRAME_FOUR_TITLES",
-    total_rounds: Optional[int] = None,
-    seed: Optional[int] = None,
-) -> Game:
+    total_rounds: Optional[int],
+    seed: int,
+) -> tuple[random.Random, list[CollectionItem], dict | None, dict]:
+    """Выбираем элементы версии под раунды: (rng, выбранные items, индекс дистракторов, манифесты кадров)."""
     # проверяем, что версия существует
     ver = await session.scalar(
         select(CollectionVersion).where(CollectionVersion.id == version_id)
@@ -35,23 +50,15 @@ async def create_game_from_collection(
     if not ver:
         raise ValueError(f"CollectionVersion {version_id} not found")
 
-    items = (
-        await session.execute(
-            select(CollectionItem)
-            .where(CollectionItem.version_id == version_id)
-            .order_by(CollectionItem.ord)
-        )
-    ).scalars().all()
+    items = (await session.execute(version_items_query(ver))).scalars().all()
 
     if not items:
         raise ValueError("Collection has no items")
 
     max_rounds = len(items)
-    n_rounds = total_rounds or min(100, max_rounds)
+    # потолок: число раундов определяет, сколько запросов уйдёт в tmdb-sync
+    n_rounds = min(total_rounds or 100, max_rounds, GAME_MAX_ROUNDS)
 
-    # seed: либо явный, либо из времени
-    if seed is None:
-        seed = int(time.time())
     rng = random.Random(seed)
 
     # перемешиваем порядок элементов версии и берём первые n_rounds
@@ -59,122 +66,519 @@ async def create_game_from_collection(
     rng.shuffle(items_shuffled)
     selected = items_shuffled[:n_rounds]
 
+    # индекс дистракторов версии (если версия собрана с ним)
+    pools = None
+    if any(item.pool_keys for item in selected):
+        rows = await session.execute(
+            select(CollectionDistractorPool).where(CollectionDistractorPool.version_id == version_id)
+        )
+        pools = {p.key: p.items for p in rows.scalars()}
+
+    # кадры — из манифестов, сохранённых при компиляции, а не /frames на каждый раунд
+    manifests = await get_frame_manifests(session, selected)
+
+    return rng, selected, pools, manifests
+
+
+async def build_round_specs(
+    session: AsyncSession,
+    *,
+    version_id: int,
+    mode: str,
+    total_rounds: Optional[int],
+    seed: int,
+) -> list[dict]:
+    """Собираем раунды версии без записи раундов в БД (для игры или шаблона в пуле).
+
+    Транзакцию сессии коммитим сразу после чтения версии, до запросов в tmdb-sync.
+    """
+    rng, selected, pools, manifests = await _plan_rounds(
+        session, version_id=version_id, total_rounds=total_rounds, seed=seed
+    )
+    # закрываем читающую транзакцию: пока ждём tmdb-sync, соединение
+    # возвращается в пул, а не висит idle in transaction
+    # (expire_on_commit=False — загруженные items остаются доступны)
+    await session.commit()
+    # сеть — параллельно, rng — по порядку (см. iter_round_specs)
+    return [
+        spec
+        async for spec in iter_round_specs(selected, mode, rng, pools=pools, manifests=manifests)
+    ]
+
+
+def _compact_spec(spec: dict) -> dict:
+    if "options" not in spec:
+        return spec
+    compact = {k: v for k, v in spec.items() if k != "options"}
+    compact["option_ids"] = [o["id"] for o in spec["options"]]
+    return compact
+
+
+async def compact_round_specs(session: AsyncSession, specs: list[dict]) -> list[dict]:
+    """Спеки раундов в формате хранения: названия вариантов — в titles, в раунде только option_ids.
+
+    Уже компактные спеки (шаблоны пула) проходят как есть. Коммит — на вызывающей стороне.
+    """
+    by_type: dict[str, list[dict]] = {}
+    for spec in specs:
+        if "options" in spec:
+            by_type.setdefault(spec["_type"], []).extend(spec["options"])
+    for _type, options in by_type.items():
+        await remember_titles(session, _type, options)
+    return [_compact_spec(spec) for spec in specs]
+
+
+async def add_rounds(
+    session: AsyncSession,
+    game_id: int,
+    specs: list[dict],
+    *,
+    start_ord: int = 1,
+) -> None:
+    """Пишем раунды одним executemany-INSERT, без ORM unit-of-work на каждый объект."""
+    if not specs:
+        return
+    specs = await compact_round_specs(session, specs)
+    await session.execute(
+        insert(GameRound),
+        [
+            {"game_id": game_id, "ord": ord_, **spec}
+            for ord_, spec in enumerate(specs, start=start_ord)
+        ],
+    )
+
+
+async def create_game_from_collection(
+    session: AsyncSession,
+    *,
+    version_id: int,
+    mode: str = "ONE_FRAME_FOUR_TITLES",
+    total_rounds: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> Game:
+    # seed: либо явный, либо из времени
+    if seed is None:
+        seed = int(time.time())
+
+    specs = await build_round_specs(
+        session, version_id=version_id, mode=mode, total_rounds=total_rounds, seed=seed
+    )
+
     game = Game(
         version_id=version_id,
         mode=mode,
-        total_rounds=n_rounds,
+        # реальное количество раундов, которое удалось собрать
+        total_rounds=len(specs),
         seed=seed,
         score=0,
         created_at=datetime.utcnow(),
         finished_at=None,
+        built_at=datetime.utcnow(),
     )
     session.add(game)
     await session.flush()  # чтобы появился game.id
 
-    ord_counter = 1
-    for item in selected:
-        tmdb_id = item.tmdb_id
-        tmdb_type = item._type or "movie"
-
-        correct_doc = await get_movie(tmdb_id, _type=tmdb_type)
-        if not correct_doc:
-            continue
-
-        frame_paths = await pick_frame_paths(tmdb_id, tmdb_type, mode, rng)
-        if not frame_paths:
-            # на всякий случай, если вдруг фильм без кадров
-            continue
-
-        distractors = await choose_distractors(correct_doc, need=3, rng=rng)
-        if len(distractors) < 3:
-            # если не смогли набрать вариантов — пропускаем (MVP)
-            continue
-
-        options, correct_index = build_options(correct_doc, distractors, rng)
-
-        gr = GameRound(
-            game_id=game.id,
-            ord=ord_counter,
-            correct_tmdb_id=tmdb_id,
-            _type=tmdb_type,
-            frame_paths=frame_paths,
-            options=options,
-            correct_index=correct_index,
-            answered_index=None,
-            is_correct=None,
-            answered_at=None,
-        )
-        session.add(gr)
-        ord_counter += 1
-
-    # реальное количество раундов, которое удалось собрать
-    game.total_rounds = ord_counter - 1
+    await add_rounds(session, game.id, specs)
     await session.commit()
     await session.refresh(game)
     return game
 
 
+async def create_game_streaming(
+    session: AsyncSession,
+    *,
+    version_id: int,
+    mode: str = "ONE_FRAME_FOUR_TITLES",
+    total_rounds: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> tuple[Game, AsyncIterator[dict]]:
+    """Потоковое создание игры: строку games коммитим сразу, раунды — по мере сборки.
+
+    Возвращает (игра, поток событий). В игре total_rounds — плановое число раундов,
+    built_at=None; итог проставляется в конце сборки. События:
+    {"type": "round", "ord", **spec} для каждого раунда и {"type": "done", "total_rounds"}
+    последним ("error" перед ним, если сборка упала). Выбор раундов и запись игры —
+    в сессии запроса; сборка идёт в фоне со своими сессиями и не прерывается,
+    если клиент отключился.
+    """
+    # seed: либо явный, либо из времени
+    if seed is None:
+        seed = int(time.time())
+
+    rng, selected, pools, manifests = await _plan_rounds(
+        session, version_id=version_id, total_rounds=total_rounds, seed=seed
+    )
+    game = Game(
+        version_id=version_id,
+        mode=mode,
+        total_rounds=len(selected),  # план; реальное число — в конце сборки
+        seed=seed,
+        score=0,
+        created_at=datetime.utcnow(),
+        finished_at=None,
+        built_at=None,
+    )
+    session.add(game)
+    # коммит отдаёт соединение сессии запроса: поток раундов его не держит
+    await session.commit()
+
+    events: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(
+        _build_game_in_background(game.id, mode, selected, pools, manifests, rng, events)
+    )
+    _background_builds.add(task)
+    task.add_done_callback(_background_builds.discard)
+
+    async def stream() -> AsyncIterator[dict]:
+        while True:
+            event = await events.get()
+            yield event
+            if event["type"] == "done":
+                return
+
+    return game, stream()
+
+
+async def _build_game_in_background(
+    game_id: int,
+    mode: str,
+    selected: list[CollectionItem],
+    pools: dict | None,
+    manifests: dict,
+    rng: random.Random,
+    events: asyncio.Queue,
+) -> None:
+    SessionLocal = get_sessionmaker()
+    built = 0
+    try:
+        async with SessionLocal() as session:
+            async for spec in iter_round_specs(selected, mode, rng, pools=pools, manifests=manifests):
+                built += 1
+                # коммитим каждый раунд: он должен быть доступен для игры сразу
+                await add_rounds(session, game_id, [spec], start_ord=built)
+                await session.commit()
+                events.put_nowait({"type": "round", "ord": built, **spec})
+    except Exception:
+        logger.exception("Streaming build of game %s failed after %d rounds", game_id, built)
+        events.put_nowait({"type": "error", "detail": "round build failed"})
+    finally:
+        # фиксируем реальное число раундов; если игрок уже ответил на все
+        # собранные раунды (или не собралось ни одного), игра на этом и заканчивается
+        now = datetime.utcnow()
+        values: dict = {
+            "total_rounds": built,
+            "built_at": now,
+            "finished_at": case(
+                (Game.finished_at.is_(None) & (Game.answered_count >= built), now),
+                else_=Game.finished_at,
+            ),
+        }
+        try:
+            async with SessionLocal() as session:
+                await session.execute(update(Game).where(Game.id == game_id).values(**values))
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to finalize streamed game %s (%d rounds)", game_id, built)
+        finally:
+            # стрим ждёт done в любом случае, иначе клиент висит до таймаута
+            events.put_nowait({"type": "done", "total_rounds": built})
+
+
+@dataclass
+class AnswerResult:
+    game_id: int
+    ord: int
+    is_correct: bool
+    correct_index: int
+    score: int
+    finished: bool
+    finished_now: bool  # игра завершилась именно этим ответом
+    # следующий раунд (answer_round(..., with_next=True)), None — если его нет
+    next_round: Optional[dict] = None
+
+
+# Один атомарный запрос на ответ:
+#   ans — проставляем ответ, только если раунд ещё не отвечен и индекс валиден;
+#   upd — если ответ записан: очки, счётчики и finished_at. Условие на
+#         answered_count проверяется под блокировкой строки games, поэтому
+#         параллельные ответы на последние раунды не «теряют» завершение игры;
+#   SELECT — снимок игры/раунда до изменений (нужен, если ans ничего не обновил)
+#            и, по запросу, следующий раунд — чтобы клиенту не ходить за ним отдельно.
+_ANSWER_SQL_TEMPLATE = """
+WITH ans AS (
+    UPDATE game_rounds r
+    SET answered_index = :answer_index,
+        is_correct = (r.correct_index = :answer_index),
+        answered_at = CAST(:now AS timestamp)
+    WHERE r.game_id = :game_id
+      AND r.ord = :ord
+      AND r.answered_index IS NULL
+      AND :answer_index >= 0
+      AND :answer_index < coalesce(json_array_length(r.option_ids), json_array_length(r.options))
+    RETURNING r.is_correct
+),
+upd AS (
+    UPDATE games g
+    SET score = g.score + CASE WHEN ans.is_correct THEN 1 ELSE 0 END,
+        correct_count = g.correct_count + CASE WHEN ans.is_correct THEN 1 ELSE 0 END,
+        answered_count = g.answered_count + 1,
+        finished_at = CASE
+            WHEN g.finished_at IS NULL AND g.answered_count + 1 >= g.total_rounds
+                THEN CAST(:now AS timestamp)
+            ELSE g.finished_at
+        END
+    FROM ans
+    WHERE g.id = :game_id
+    RETURNING g.score, g.finished_at
+)
+SELECT
+    g.id AS game_id,
+    r.ord AS round_ord,
+    r.correct_index,
+    r.answered_index,
+    r.is_correct,
+    coalesce(json_array_length(r.option_ids), json_array_length(r.options)) AS n_options,
+    g.score,
+    g.finished_at,
+    ans.is_correct AS new_is_correct,
+    upd.score AS new_score,
+    upd.finished_at AS new_finished_at{next_columns}
+FROM games g
+LEFT JOIN game_rounds r ON r.game_id = g.id AND r.ord = :ord
+LEFT JOIN ans ON true
+LEFT JOIN upd ON true{next_join}
+WHERE g.id = :game_id
+"""
+
+_ANSWER_SQL = text(_ANSWER_SQL_TEMPLATE.format(next_columns="", next_join=""))
+# JSON-колонки текстового запроса нужно типизировать явно, иначе придут строкой.
+# Названия вариантов следующего раунда подтягиваем из titles тем же запросом
+# (раунды старого формата — из options), чтобы ответ с next не ходил в БД ещё раз.
+_ANSWER_NEXT_SQL = text(
+    _ANSWER_SQL_TEMPLATE.format(
+        next_columns=""",
+    g.mode,
+    g.total_rounds,
+    nr.ord AS next_ord,
+    nr.frame_paths AS next_frame_paths,
+    coalesce(
+        (
+            SELECT json_agg(
+                json_build_object('id', CAST(o.id AS integer), 'title', t.title, 'title_ru', t.title_ru)
+                ORDER BY o.n
+            )
+            FROM json_array_elements_text(nr.option_ids) WITH ORDINALITY AS o(id, n)
+            LEFT JOIN titles t ON t.tmdb_id = CAST(o.id AS integer) AND t._type = nr._type
+        ),
+        nr.options
+    ) AS next_options,
+    nr.answered_index AS next_answered_index""",
+        next_join="""
+LEFT JOIN game_rounds nr ON nr.game_id = g.id AND nr.ord = :ord + 1""",
+    )
+).columns(next_frame_paths=JSON, next_options=JSON)
+
+
+# Пакетная запись ответов, принятых без Postgres (горячее состояние, см. hot_state):
+#   a   — пачка ответов массивами (unnest), по строке на ответ;
+#   r   — проставляем ответы; answered_index IS NULL делает повтор пачки безопасным;
+#   agg — что реально записалось, по играм;
+#   UPDATE games — счётчики, очки и finished_at, как в _ANSWER_SQL.
+_ANSWER_BATCH_SQL = text("""
+WITH a AS (
+    SELECT *
+    FROM unnest(
+        CAST(:game_ids AS integer[]),
+        CAST(:ords AS integer[]),
+        CAST(:answered_indexes AS integer[]),
+        CAST(:is_corrects AS boolean[]),
+        CAST(:answered_ats AS timestamp[])
+    ) AS t(game_id, ord, answered_index, is_correct, answered_at)
+),
+r AS (
+    UPDATE game_rounds gr
+    SET answered_index = a.answered_index,
+        is_correct = a.is_correct,
+        answered_at = a.answered_at
+    FROM a
+    WHERE gr.game_id = a.game_id
+      AND gr.ord = a.ord
+      AND gr.answered_index IS NULL
+    RETURNING gr.game_id, gr.is_correct, gr.answered_at
+),
+agg AS (
+    SELECT game_id,
+           count(*) AS answered,
+           count(*) FILTER (WHERE is_correct) AS correct,
+           max(answered_at) AS last_answered_at
+    FROM r
+    GROUP BY game_id
+)
+UPDATE games g
+SET score = g.score + agg.correct,
+    correct_count = g.correct_count + agg.correct,
+    answered_count = g.answered_count + agg.answered,
+    finished_at = CASE
+        WHEN g.finished_at IS NULL AND g.answered_count + agg.answered >= g.total_rounds
+            THEN agg.last_answered_at
+        ELSE g.finished_at
+    END
+FROM agg
+WHERE g.id = agg.game_id
+""")
+
+
+async def write_answers(session: AsyncSession, answers: list[dict]) -> None:
+    """Пишем пачку ответов {game_id, ord, answered_index, is_correct, answered_at} одним запросом."""
+    if not answers:
+        return
+    await session.execute(
+        _ANSWER_BATCH_SQL,
+        {
+            "game_ids": [a["game_id"] for a in answers],
+            "ords": [a["ord"] for a in answers],
+            "answered_indexes": [a["answered_index"] for a in answers],
+            "is_corrects": [a["is_correct"] for a in answers],
+            "answered_ats": [a["answered_at"] for a in answers],
+        },
+    )
+
+
+def round_payload(game: Game, gr: GameRound, options: Optional[list[dict]] = None) -> dict:
+    """Раунд в том виде, в каком его отдаёт API (без правильного ответа).
+
+    options — варианты с названиями (resolve_round_options); без них берётся
+    gr.options: в горячем состоянии там уже готовые варианты.
+    """
+    return {
+        "game_id": game.id,
+        "ord": gr.ord,
+        "mode": game.mode,
+        "total_rounds": game.total_rounds,
+        "frame_paths": gr.frame_paths,
+        "options": gr.options if options is None else options,
+        "answered_index": gr.answered_index,
+    }
+
+
+async def load_round_payload(session: AsyncSession, game: Game, gr: GameRound) -> dict:
+    """round_payload раунда из Postgres: названия вариантов — из titles."""
+    [options] = await resolve_round_options(session, [gr])
+    return round_payload(game, gr, options)
+
+
+def _next_round(row) -> Optional[dict]:
+    if row.next_ord is None:
+        return None
+    return {
+        "game_id": row.game_id,
+        "ord": row.next_ord,
+        "mode": row.mode,
+        "total_rounds": row.total_rounds,
+        "frame_paths": row.next_frame_paths,
+        "options": row.next_options,
+        "answered_index": row.next_answered_index,
+    }
+
+
+async def _current_answer(
+    session: AsyncSession,
+    *,
+    game_id: int,
+    ord: int,
+    with_next: bool,
+) -> AnswerResult:
+    """Состояние уже отвеченного раунда (ответ записал параллельный запрос)."""
+    next_round = None
+    if with_next:
+        game = await session.get(Game, game_id)
+        nr = await session.scalar(
+            select(GameRound).where(GameRound.game_id == game_id, GameRound.ord == ord + 1)
+        )
+        if game is not None and nr is not None:
+            next_round = await load_round_payload(session, game, nr)
+
+    row = (
+        await session.execute(
+            select(
+                Game.score,
+                Game.finished_at,
+                GameRound.correct_index,
+                GameRound.is_correct,
+            )
+            .join(GameRound, GameRound.game_id == Game.id)
+            .where(Game.id == game_id, GameRound.ord == ord)
+        )
+    ).one()
+    return AnswerResult(
+        game_id=game_id,
+        ord=ord,
+        is_correct=bool(row.is_correct),
+        correct_index=row.correct_index,
+        score=row.score,
+        finished=row.finished_at is not None,
+        finished_now=False,
+        next_round=next_round,
+    )
+
+
 async def answer_round(
     session: AsyncSession,
     *,
     game_id: int,
     ord: int,
     answer_index: int,
-) -> tuple[Game, GameRound, bool]:
+    with_next: bool = False,
+) -> AnswerResult:
     """
-    Обрабатывает ответ на раунд.
-    Возвращает (game, round, finished_now).
+    Обрабатывает ответ на раунд одним запросом (см. _ANSWER_SQL).
 
-    finished_now == True, если после этого ответа игра стала завершённой.
+    Если раунд уже отвечен — просто возвращаем текущее состояние (без модификаций).
+    with_next=True — в том же запросе достаём и следующий раунд (AnswerResult.next_round).
     """
-    game = await session.get(Game, game_id)
-    if not game:
+    now = datetime.utcnow()
+    row = (
+        await session.execute(
+            _ANSWER_NEXT_SQL if with_next else _ANSWER_SQL,
+            {"game_id": game_id, "ord": ord, "answer_index": answer_index, "now": now},
+        )
+    ).one_or_none()
+    await session.commit()
+
+    if row is None:
         raise AnswerError("Game not found")
+    if row.round_ord is None:
+        raise AnswerError("Round not found")
 
-    gr = await session.scalar(
-        select(GameRound).where(
-            GameRound.game_id == game_id,
-            GameRound.ord == ord,
+    if row.new_is_correct is not None:
+        # ответ записан этим запросом
+        return AnswerResult(
+            game_id=game_id,
+            ord=ord,
+            is_correct=row.new_is_correct,
+            correct_index=row.correct_index,
+            score=row.new_score,
+            finished=row.new_finished_at is not None,
+            finished_now=row.finished_at is None and row.new_finished_at is not None,
+            next_round=_next_round(row) if with_next else None,
         )
-    )
-    if not gr:
-        raise AnswerError("Round not found")
 
-    # если уже отвечено — просто возвращаем текущее состояние (без модификаций)
-    if gr.answered_index is not None:
-        return game, gr, (game.finished_at is not None)
+    if row.answered_index is not None:
+        # уже было отвечено раньше
+        return AnswerResult(
+            game_id=game_id,
+            ord=ord,
+            is_correct=bool(row.is_correct),
+            correct_index=row.correct_index,
+            score=row.score,
+            finished=row.finished_at is not None,
+            finished_now=False,
+            next_round=_next_round(row) if with_next else None,
+        )
 
     # валидация индекса
-    if answer_index < 0 or answer_index >= len(gr.options):
+    if answer_index < 0 or answer_index >= row.n_options:
         raise AnswerError("Invalid answer index")
 
-    # проставляем ответ
-    gr.answered_index = answer_index
-    gr.is_correct = (answer_index == gr.correct_index)
-    gr.answered_at = datetime.utcnow()
-
-    # простое правило: +1 очко за правильный ответ
-    if gr.is_correct:
-        game.score += 1
-
-    # проверяем, остались ли ещё неотвеченные раунды
-    res = await session.execute(
-        select(func.count())
-        .select_from(GameRound)
-        .where(
-            GameRound.game_id == game_id,
-            GameRound.answered_index.is_(None),
-        )
-    )
-    remaining = res.scalar_one()
-
-    finished_now = False
-    if remaining == 0 and game.finished_at is None:
-        game.finished_at = datetime.utcnow()
-        finished_now = True
-
-    await session.commit()
-    await session.refresh(game)
-    await session.refresh(gr)
-
-    return game, gr, finished_now
+    # раунд успел ответить параллельный запрос — отдаём его результат
+    return await _current_answer(session, game_id=game_id, ord=ord, with_next=with_next)
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import abc
+import os
+import shlex
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    HOT_STATE_BACKEND,
+    HOT_STATE_MAX_GAMES,
+    HOT_STATE_STICKY_ROUTING,
+    HOT_STATE_TTL,
+    WEB_CONCURRENCY,
+)
+from app.models.game import Game, GameRound
+from app.services.answer_writer import AnswerWriteBehind
+from app.services.games import AnswerError, AnswerResult, round_payload
+from app.services.titles import resolve_round_options, titles_revision
+
+
+# ---------- состояние игры в горячем хранилище ----------
+@dataclass
+class HotRound:
+    ord: int
+    frame_paths: list[str]
+    options: list[dict]  # уже с названиями (из titles при загрузке игры)
+    correct_index: int
+    answered_index: Optional[int] = None
+    is_correct: Optional[bool] = None
+    answered_at: Optional[datetime] = None
+
+
+@dataclass
+class HotGame:
+    """Заголовок игры + все раунды; атрибуты названы как у Game/GameRound (round_payload)."""
+    id: int
+    version_id: int
+    mode: str
+    total_rounds: int
+    score: int
+    answered_count: int
+    correct_count: int
+    finished_at: Optional[datetime]
+    rounds: dict[int, HotRound] = field(default_factory=dict)
+    built_at: Optional[datetime] = None
+    titles_revision: str = ""  # ревизия titles, из которой подставлены названия вариантов
+
+
+@dataclass
+class AppliedAnswer:
+    """Что сделал apply_answer: снимок игры и раунда после ответа."""
+    game: HotGame
+    round: HotRound
+    recorded: bool       # ответ записан этим вызовом (а не был раньше)
+    finished_now: bool
+
+
+def _apply_answer(game: HotGame, ord: int, answer_index: int, now: datetime) -> AppliedAnswer:
+    """Та же логика, что у _ANSWER_SQL, только над HotGame (мутирует его)."""
+    r = game.rounds.get(ord)
+    if r is None:
+        raise AnswerError("Round not found")
+    if r.answered_index is not None:
+        return AppliedAnswer(game=game, round=r, recorded=False, finished_now=False)
+    if answer_index < 0 or answer_index >= len(r.options):
+        raise AnswerError("Invalid answer index")
+
+    r.answered_index = answer_index
+    r.is_correct = r.correct_index == answer_index
+    r.answered_at = now
+    game.answered_count += 1
+    if r.is_correct:
+        game.score += 1
+        game.correct_count += 1
+    finished_now = game.finished_at is None and game.answered_count >= game.total_rounds
+    if finished_now:
+        game.finished_at = now
+    return AppliedAnswer(game=game, round=r, recorded=True, finished_now=finished_now)
+
+
+class HotStateStore(abc.ABC):
+    """Хранилище идущих игр (ключ — game_id).
+
+    Интерфейс рассчитан на key-value хранилище вроде Redis: apply_answer
+    должен быть атомарным (проверка «не отвечен» + запись) на стороне
+    хранилища. Отдаваемые объекты вызывающий код не мутирует.
+    """
+
+    @abc.abstractmethod
+    async def get(self, game_id: int) -> HotGame | None: ...
+
+    @abc.abstractmethod
+    async def put_if_absent(self, game: HotGame) -> HotGame:
+        """Кладём игру, если её ещё нет; возвращаем то, что в итоге лежит в хранилище."""
+
+    @abc.abstractmethod
+    async def apply_answer(
+        self, game_id: int, ord: int, answer_index: int, now: datetime
+    ) -> AppliedAnswer | None:
+        """None — игры в хранилище нет (загрузить из Postgres и повторить)."""
+
+    @abc.abstractmethod
+    async def delete(self, game_id: int) -> None: ...
+
+
+class MemoryHotStateStore(HotStateStore):
+    """In-process LRU с TTL простоя: для тестов и одного процесса/ноды.
+
+    При нескольких процессах игра должна попадать в один и тот же процесс
+    (sticky-балансировка), иначе состояния разойдутся.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple[float, HotGame]]" = OrderedDict()
+
+    def _touch(self, game_id: int) -> HotGame | None:
+        entry = self._data.get(game_id)
+        if entry is None:
+            return None
+        expires_at, game = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            del self._data[game_id]
+            return None
+        self._data[game_id] = (now + self.ttl, game)
+        self._data.move_to_end(game_id)
+        return game
+
+    async def get(self, game_id: int) -> HotGame | None:
+        return self._touch(game_id)
+
+    async def put_if_absent(self, game: HotGame) -> HotGame:
+        existing = self._touch(game.id)
+        if existing is not None:
+            return existing
+        self._data[game.id] = (time.monotonic() + self.ttl, game)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return game
+
+    async def apply_answer(
+        self, game_id: int, ord: int, answer_index: int, now: datetime
+    ) -> AppliedAnswer | None:
+        game = self._touch(game_id)
+        if game is None:
+            return None
+        # без await внутри — атомарно относительно других корутин
+        applied = _apply_answer(game, ord, answer_index, now)
+        # наружу — копии, чтобы следующий ответ не поменял уже отданный результат
+        return replace(
+            applied,
+            game=replace(game, rounds={}),
+            round=replace(applied.round),
+        )
+
+    async def delete(self, game_id: int) -> None:
+        self._data.pop(game_id, None)
+
+
+# ---------- модульное состояние: хранилище + запись ответов в Postgres ----------
+_store: HotStateStore | None = None
+_writer: AnswerWriteBehind | None = None
+
+
+def hot_state_enabled() -> bool:
+    return HOT_STATE_BACKEND != "off"
+
+
+def _server_workers() -> int:
+    """Сколько процессов API запускает сервер: WEB_CONCURRENCY и --workers/-w
+    из командной строки uvicorn/gunicorn (и GUNICORN_CMD_ARGS)."""
+    workers = WEB_CONCURRENCY
+    args = sys.argv[1:] + shlex.split(os.getenv("GUNICORN_CMD_ARGS", ""))
+    for i, arg in enumerate(args):
+        name, eq, value = arg.partition("=")
+        if name in ("--workers", "-w"):
+            if not eq:
+                value = args[i + 1] if i + 1 < len(args) else ""
+        elif arg.startswith("-w"):
+            value = arg[2:]  # -w4
+        else:
+            continue
+        if value.isdigit():
+            workers = max(workers, int(value))
+    return workers
+
+
+def _make_store() -> HotStateStore:
+    if HOT_STATE_BACKEND == "memory":
+        # у каждого процесса своя память: ответы на одну игру из разных
+        # процессов разойдутся (двойной ответ, потерянные очки)
+        workers = _server_workers()
+        if workers > 1:
+            raise ValueError(
+                f"HOT_STATE_BACKEND=memory requires one API process, got {workers} "
+                "(WEB_CONCURRENCY / --workers)"
+            )
+        if not HOT_STATE_STICKY_ROUTING:
+            # реплики на других нодах отсюда не видны — их отсутствие
+            # (или sticky-балансировку по игре) подтверждает деплой
+            raise ValueError(
+                "HOT_STATE_BACKEND=memory requires HOT_STATE_STICKY_ROUTING=1: "
+                "every request for a game must reach this process"
+            )
+        return MemoryHotStateStore(maxsize=HOT_STATE_MAX_GAMES, ttl=HOT_STATE_TTL)
+    raise ValueError(f"Unknown HOT_STATE_BACKEND: {HOT_STATE_BACKEND!r}")
+
+
+def start_hot_state() -> None:
+    global _store, _writer
+    if not hot_state_enabled() or _store is not None:
+        return
+    _store = _make_store()
+    _writer = AnswerWriteBehind()
+    _writer.start()
+
+
+async def stop_hot_state() -> None:
+    global _store, _writer
+    if _writer is not None:
+        await _writer.stop()
+    _store = None
+    _writer = None
+
+
+def hot_state_stats() -> dict:
+    if _writer is None:
+        return {"backend": HOT_STATE_BACKEND}
+    return {"backend": HOT_STATE_BACKEND, "answers": _writer.stats()}
+
+
+async def _load_game(session: AsyncSession, game_id: int) -> HotGame | None:
+    """Игра из Postgres в хранилище. None — игры нет, она ещё собирается или уже закончена."""
+    assert _store is not None and _writer is not None
+    # ответы, принятые до вытеснения игры из хранилища, должны быть уже в БД
+    if _writer.has_pending(game_id):
+        await _writer.flush(session)
+
+    game = await session.get(Game, game_id)
+    if game is None or game.built_at is None or game.finished_at is not None:
+        # потоковая сборка ещё добавляет раунды, а законченную игру держать
+        # в памяти незачем — такие игры читаем из Postgres
+        return None
+    rounds = (
+        await session.execute(select(GameRound).where(GameRound.game_id == game_id))
+    ).scalars().all()
+    # названия вариантов подставляем один раз, дальше раунды отдаются без запросов
+    revision = await titles_revision(session)
+    options = await resolve_round_options(session, rounds)
+    hot = HotGame(
+        id=game.id,
+        version_id=game.version_id,
+        mode=game.mode,
+        total_rounds=game.total_rounds,
+        score=game.score,
+        answered_count=game.answered_count,
+        correct_count=game.correct_count,
+        finished_at=game.finished_at,
+        rounds={
+            gr.ord: HotRound(
+                ord=gr.ord,
+                frame_paths=gr.frame_paths,
+                options=opts,
+                correct_index=gr.correct_index,
+                answered_index=gr.answered_index,
+                is_correct=gr.is_correct,
+                answered_at=gr.answered_at,
+            )
+            for gr, opts in zip(rounds, options)
+        },
+        built_at=game.built_at,
+        titles_revision=revision,
+    )
+    # сессию дальше не держим: остальные запросы по игре в Postgres не ходят
+    await session.rollback()
+    # параллельный запрос мог загрузить игру (и принять ответ) раньше нас
+    return await _store.put_if_absent(hot)
+
+
+async def hot_game(session: AsyncSession, game_id: int) -> HotGame | None:
+    """Игра из горячего хранилища (с подгрузкой из Postgres при промахе).
+
+    None — горячее состояние выключено, игры нет, она ещё собирается или закончена:
+    вызывающий код идёт обычным путём через Postgres.
+    """
+    if _store is None:
+        return None
+    game = await _store.get(game_id)
+    if game is None:
+        game = await _load_game(session, game_id)
+    return game
+
+
+def _next_round_payload(game: HotGame, ord: int) -> Optional[dict]:
+    nr = game.rounds.get(ord + 1)
+    return round_payload(game, nr) if nr is not None else None
+
+
+async def answer_hot(
+    session: AsyncSession,
+    *,
+    game_id: int,
+    ord: int,
+    answer_index: int,
+    with_next: bool = False,
+) -> AnswerResult | None:
+    """answer_round поверх горячего хранилища: ответ проверяется по раундам
+    в хранилище, в Postgres он уходит пачкой (AnswerWriteBehind). Когда
+    подтверждать — сразу или после коммита пачки — решает ANSWER_DURABILITY.
+
+    None — игру нужно обслужить обычным путём (см. hot_game).
+    """
+    if _store is None or _writer is None:
+        return None
+
+    now = datetime.utcnow()
+    applied = await _store.apply_answer(game_id, ord, answer_index, now)
+    if applied is None:
+        if await _load_game(session, game_id) is None:
+            return None
+        applied = await _store.apply_answer(game_id, ord, answer_index, now)
+        if applied is None:
+            return None
+
+    r = applied.round
+    if applied.recorded:
+        if applied.finished_now:
+            # игра закончена — её состояние уходит в Postgres, не дожидаясь таймера
+            _writer.flush_soon()
+        # ack — сразу; group — после коммита пачки с этим ответом
+        await _writer.commit(
+            {
+                "game_id": game_id,
+                "ord": ord,
+                "answered_index": r.answered_index,
+                "is_correct": r.is_correct,
+                "answered_at": r.answered_at,
+            }
+        )
+    else:
+        # повтор: ответ на раунд уже принят, но мог ещё не дойти до Postgres
+        await _writer.wait_committed(game_id)
+
+    next_round = None
+    if with_next:
+        full = await _store.get(game_id)
+        next_round = _next_round_payload(full, ord) if full is not None else None
+
+    return AnswerResult(
+        game_id=game_id,
+        ord=ord,
+        is_correct=bool(r.is_correct),
+        correct_index=r.correct_index,
+        score=applied.game.score,
+        finished=applied.game.finished_at is not None,
+        finished_now=applied.finished_now,
+        next_round=next_round,
+    )
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
 from datetime import datetime
+import asyncio
 import random
 
-from app.services.tmdb_sync_client import get_movie, get_frames, search_movies
+from app.core.config import GAME_BUILD_CONCURRENCY, TMDB_SYNC_BULK_CHUNK
+from app.services.frame_manifests import manifest_paths
+from app.services.tmdb_sync_client import (
+    get_frames_bulk,
+    get_movies_bulk,
+    search_movies,
+)
 
 
 def _extract_year(release_date: str | None) -> int | None:
@@ -16,39 +23,29 @@ def _extract_year(release_date: str | None) -> int | None:
         return None
 
 
-async def pick_frame_paths(
-    tmdb_id: int,
-    _type: str,
+def select_frame_paths(
+    paths: Sequence[str],
     mode: str,
     rng: random.Random,
 ) -> List[str]:
-    """Выбираем кадры для раунда.
+    """Выбираем кадры для раунда из манифеста (пути кадров фильма).
 
     ONE_FRAME_FOUR_TITLES  -> 1 кадр
     FOUR_FRAMES_ONE_TITLE  -> до 4 кадров
+
+    Случайные k позиций (rng.sample по range) вместо перетасовки всего
+    списка: O(k), и общий список (кэш, манифест) не копируется.
     """
-    frames = await get_frames(tmdb_id, _type=_type)
-    if not frames:
+    if not paths:
         return []
 
-    # уже отсортированы на стороне tmdb-sync по качеству, но чуть перетасуем
-    rng.shuffle(frames)
-
-    if mode == "FOUR_FRAMES_ONE_TITLE":
-        return [f["path"] for f in frames[:4]]
-    else:
-        return [frames[0]["path"]]
+    k = min(4 if mode == "FOUR_FRAMES_ONE_TITLE" else 1, len(paths))
+    return [paths[i] for i in rng.sample(range(len(paths)), k)]
 
 
-async def choose_distractors(
-    correct_doc: Dict[str, Any],
-    *,
-    need: int,
-    rng: random.Random,
-) -> List[Dict[str, Any]]:
-    """Подбираем отвлекающие фильмы.
+def _distractor_filters(correct_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Фильтры поиска отвлекающих фильмов, от самого похожего к самому общему.
 
-    Стратегия:
     1) тот же первый жанр + то же десятилетие
     2) тот же жанр
     3) то же десятилетие
@@ -58,7 +55,6 @@ async def choose_distractors(
     decade = (year // 10) * 10 if year else None
     genre_ids = correct_doc.get("genre_ids") or []
     main_genre = genre_ids[0] if genre_ids else None
-    tmdb_type = correct_doc.get("_type") or "movie"
 
     pools: List[Dict[str, Any]] = []
     if main_genre and decade:
@@ -68,36 +64,145 @@ async def choose_distractors(
     if decade:
         pools.append({"year_from": decade, "year_to": decade + 9})
     pools.append({})  # fallback
+    return pools
+
+
+def distractor_pool_key(_type: str, flt: Dict[str, Any]) -> str:
+    """Ключ пула дистракторов: movie:g18:d1990 | movie:g18 | movie:d1990 | movie."""
+    parts = [_type]
+    if flt.get("genre_id"):
+        parts.append(f"g{flt['genre_id']}")
+    if flt.get("year_from"):
+        parts.append(f"d{flt['year_from']}")
+    return ":".join(parts)
+
+
+def distractor_pool_filters(doc: Dict[str, Any], *, _type: str) -> Dict[str, Dict[str, Any]]:
+    """{ключ пула: фильтр поиска} для doc — без сети, только по его жанрам/году.
+
+    Порядок ключей — от самого похожего пула к самому общему.
+    """
+    return {distractor_pool_key(_type, flt): flt for flt in _distractor_filters(doc)}
+
+
+async def _search_distractor_pool(_type: str, flt: Dict[str, Any]) -> List[Dict[str, Any]]:
+    resp = await search_movies(
+        _type=_type,
+        genre_id=flt.get("genre_id"),
+        country_code=None,
+        year_from=flt.get("year_from"),
+        year_to=flt.get("year_to"),
+        is_animated=None,
+        sort_by="vote_count",
+        order="desc",
+        limit=50,
+        skip=0,
+    )
+    return resp.get("items") or resp.get("results") or []
+
+
+async def load_distractor_pools(
+    filters: Dict[str, Dict[str, Any]],
+    *,
+    _type: str,
+    concurrency: int = GAME_BUILD_CONCURRENCY,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Индекс дистракторов для версии коллекции: {ключ: [{id,title,title_ru}, ...]}.
+
+    Пулы — те же запросы, что делает fetch_distractor_candidates, только по одному
+    разу на уникальную пару жанр/десятилетие (filters собираются через
+    distractor_pool_filters), а не на каждый раунд.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def load(flt: Dict[str, Any]) -> List[Dict[str, Any]]:
+        async with sem:
+            return [_to_option(m) for m in await _search_distractor_pool(_type, flt)]
+
+    pools = await asyncio.gather(*(load(flt) for flt in filters.values()))
+    return dict(zip(filters.keys(), pools))
+
+
+def distractor_candidates_from_pools(
+    correct_id: int,
+    pools: Sequence[List[Dict[str, Any]]],
+    *,
+    need: int,
+) -> List[List[Dict[str, Any]]]:
+    """То же, что fetch_distractor_candidates, но по заранее собранным пулам."""
+    seen_ids = {correct_id}
+    tiers: List[List[Dict[str, Any]]] = []
+    left = need
+
+    for items in pools:
+        candidates = [m for m in items if m["id"] not in seen_ids]
+        tiers.append(candidates)
+        if len(candidates) >= left:
+            break
+        left -= len(candidates)
+        seen_ids.update(m["id"] for m in candidates)
+
+    return tiers
+
+
+async def fetch_distractor_candidates(
+    correct_doc: Dict[str, Any],
+    *,
+    need: int,
+) -> List[List[Dict[str, Any]]]:
+    """Сетевая часть подбора дистракторов: кандидаты по уровням фильтров.
+
+    Какие уровни понадобятся, от rng не зависит: если на уровне кандидатов
+    меньше, чем нужно, то выбраны будут все, и следующий уровень фильтруется
+    по ним. Поэтому запросы можно сделать заранее, а тасовать потом.
+    """
+    tmdb_type = correct_doc.get("_type") or "movie"
 
     seen_ids = {correct_doc["id"]}
-    picked: List[Dict[str, Any]] = []
+    tiers: List[List[Dict[str, Any]]] = []
+    left = need
 
-    for flt in pools:
-        resp = await search_movies(
-            _type=tmdb_type,
-            genre_id=flt.get("genre_id"),
-            country_code=None,
-            year_from=flt.get("year_from"),
-            year_to=flt.get("year_to"),
-            is_animated=None,
-            sort_by="vote_count",
-            order="desc",
-            limit=50,
-            skip=0,
-        )
-        items = resp.get("items") or resp.get("results") or []
+    for flt in _distractor_filters(correct_doc):
+        items = await _search_distractor_pool(tmdb_type, flt)
         # фильтруем уже виденные
         candidates = [m for m in items if m["id"] not in seen_ids]
+        tiers.append(candidates)
+        if len(candidates) >= left:
+            break
+        left -= len(candidates)
+        seen_ids.update(m["id"] for m in candidates)
+
+    return tiers
+
+
+def pick_distractors(
+    tiers: Sequence[List[Dict[str, Any]]],
+    *,
+    need: int,
+    rng: random.Random,
+) -> List[Dict[str, Any]]:
+    """Детерминированная часть: тасуем кандидатов уровня и набираем need штук."""
+    picked: List[Dict[str, Any]] = []
+
+    for candidates in tiers:
+        candidates = list(candidates)
         rng.shuffle(candidates)
         for m in candidates:
             picked.append(m)
-            seen_ids.add(m["id"])
             if len(picked) >= need:
                 return picked
 
     return picked[:need]
 
 
+def _to_option(m: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": m["id"],
+        "title": m.get("title") or m.get("name"),
+        "title_ru": m.get("title_ru"),
+    }
+
+
 def build_options(
     correct: Dict[str, Any],
     distractors: List[Dict[str, Any]],
@@ -106,16 +211,9 @@ def build_options(
     """Собираем список вариантов и возвращаем (options, correct_index)."""
     options: List[Dict[str, Any]] = []
 
-    def to_opt(m: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "id": m["id"],
-            "title": m.get("title") or m.get("name"),
-            "title_ru": m.get("title_ru"),
-        }
-
-    options.append(to_opt(correct))
+    options.append(_to_option(correct))
     for d in distractors:
-        options.append(to_opt(d))
+        options.append(_to_option(d))
 
     rng.shuffle(options)
     correct_id = correct["id"]
@@ -124,3 +222,127 @@ def build_options(
         if opt["id"] == correct_id
     )
     return options, correct_index
+
+
+async def _fetch_chunk_inputs(
+    chunk: Sequence[Any],
+    pools: Dict[str, List[Dict[str, Any]]] | None,
+    manifests: Dict[Tuple[int, str], List[str]] | None,
+    sem: asyncio.Semaphore,
+    *,
+    need: int,
+) -> List[Tuple[Dict[str, Any], List[str], List[List[Dict[str, Any]]]] | None]:
+    """Входные данные для пачки раундов: (документ фильма, пути кадров, кандидаты) или None.
+
+    Кадры берём из манифестов (frame_manifests), а для фильмов без манифеста,
+    как и документы, тянем пакетно (get_frames_bulk/get_movies_bulk); кандидатов
+    в дистракторы — из индекса версии, а если его нет — поиском по каждому фильму.
+    """
+    def indexed(item: Any) -> bool:
+        return pools is not None and bool(getattr(item, "pool_keys", None))
+
+    def manifest(item: Any) -> List[str] | None:
+        if manifests is None:
+            return None
+        return manifests.get((item.tmdb_id, item._type or "movie"))
+
+    by_type: Dict[str, List[int]] = {}
+    live_by_type: Dict[str, List[int]] = {}
+    for item in chunk:
+        tmdb_type = item._type or "movie"
+        if manifest(item) is None:
+            by_type.setdefault(tmdb_type, []).append(item.tmdb_id)
+        if not indexed(item):
+            live_by_type.setdefault(tmdb_type, []).append(item.tmdb_id)
+
+    frames_res, docs_res = await asyncio.gather(
+        asyncio.gather(*(get_frames_bulk(ids, _type=t) for t, ids in by_type.items())),
+        asyncio.gather(*(get_movies_bulk(ids, _type=t) for t, ids in live_by_type.items())),
+    )
+    frames_by_type = dict(zip(by_type.keys(), frames_res))
+    docs_by_type = dict(zip(live_by_type.keys(), docs_res))
+
+    async def inputs_for(item: Any):
+        tmdb_type = item._type or "movie"
+        frames = manifest(item)
+        if frames is None:
+            frames = manifest_paths(frames_by_type[tmdb_type].get(item.tmdb_id) or [])
+        if indexed(item):
+            # вариант ответа и кандидаты — из индекса дистракторов версии
+            correct_doc = {"id": item.tmdb_id, "title": item.title, "title_ru": item.title_ru}
+            tiers = distractor_candidates_from_pools(
+                item.tmdb_id,
+                [pools.get(key) or [] for key in item.pool_keys],
+                need=need,
+            )
+            return correct_doc, frames, tiers
+
+        correct_doc = docs_by_type[tmdb_type].get(item.tmdb_id)
+        if not correct_doc:
+            return None
+        if not frames:
+            # раунд всё равно пропустим — не тратим запросы на дистракторы
+            return correct_doc, frames, []
+        async with sem:
+            tiers = await fetch_distractor_candidates(correct_doc, need=need)
+        return correct_doc, frames, tiers
+
+    return list(await asyncio.gather(*(inputs_for(item) for item in chunk)))
+
+
+async def iter_round_specs(
+    items: Sequence[Any],
+    mode: str,
+    rng: random.Random,
+    *,
+    pools: Dict[str, List[Dict[str, Any]]] | None = None,
+    manifests: Dict[Tuple[int, str], List[str]] | None = None,
+    concurrency: int = GAME_BUILD_CONCURRENCY,
+    chunk_size: int = TMDB_SYNC_BULK_CHUNK,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Собираем раунды по элементам коллекции, по порядку.
+
+    Сетевые запросы идут пачками по chunk_size элементов, все пачки — параллельно
+    (поиск дистракторов ограничен concurrency), а все обращения к rng — строго
+    последовательно в порядке items, поэтому для одного seed результат тот же,
+    что и при полностью последовательной сборке.
+    Если у элемента есть pool_keys и переданы pools (индекс дистракторов версии),
+    варианты берутся из индекса без запросов в tmdb-sync; кадры — из manifests
+    ({(tmdb_id, _type): пути}), если манифест для элемента есть.
+    Элементы, для которых раунд не собрался, пропускаются.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    chunk_size = max(1, chunk_size)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    tasks = [asyncio.create_task(_fetch_chunk_inputs(c, pools, manifests, sem, need=3)) for c in chunks]
+    try:
+        for chunk, task in zip(chunks, tasks):
+            for item, inputs in zip(chunk, await task):
+                if inputs is None:
+                    continue
+                correct_doc, frames, tiers = inputs
+
+                frame_paths = select_frame_paths(frames, mode, rng)
+                if not frame_paths:
+                    # на всякий случай, если вдруг фильм без кадров
+                    continue
+
+                distractors = pick_distractors(tiers, need=3, rng=rng)
+                if len(distractors) < 3:
+                    # если не смогли набрать вариантов — пропускаем (MVP)
+                    continue
+
+                options, correct_index = build_options(correct_doc, distractors, rng)
+
+                yield {
+                    "correct_tmdb_id": item.tmdb_id,
+                    "_type": item._type or "movie",
+                    "frame_paths": frame_paths,
+                    "options": options,
+                    "correct_index": correct_index,
+                }
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import AsyncTTLCache
+from app.core.config import TITLE_CACHE_SIZE, TITLE_CACHE_TTL
+from app.models.title import Title
+
+
+TitleKey = Tuple[int, str]                        # (tmdb_id, _type)
+TitleValue = Tuple[Optional[str], Optional[str]]  # (title, title_ru)
+
+# (tmdb_id, _type) -> (title, title_ru); правка в titles видна процессу не позже TTL
+# (или сразу, как только titles_revision заметит новую ревизию)
+_cache = AsyncTTLCache(maxsize=TITLE_CACHE_SIZE, ttl=TITLE_CACHE_TTL)
+
+# последняя ревизия titles, которую видел процесс
+_revision: Optional[datetime] = None
+_REVISION_QUERY = select(func.max(Title.updated_at))
+
+
+def title_cache_stats() -> dict:
+    return _cache.stats()
+
+
+async def remember_titles(session: AsyncSession, _type: str, options: Iterable[Dict[str, Any]]) -> None:
+    """Upsert названий из вариантов {id,title,title_ru} в titles; коммит — на вызывающей стороне.
+
+    Одни и те же популярные фильмы приходят в каждой сборке, поэтому то,
+    что уже лежит в кэше процесса с теми же названиями, не пишем.
+    Пустое название из tmdb-sync уже известное не затирает.
+    """
+    rows: Dict[TitleKey, Dict[str, Any]] = {}
+    now = datetime.utcnow()
+    for o in options:
+        key = (o["id"], _type)
+        value = (o.get("title"), o.get("title_ru"))
+        found, cached = _cache.get(key)
+        if found and cached == value:
+            continue
+        rows[key] = {
+            "tmdb_id": o["id"],
+            "_type": _type,
+            "title": value[0],
+            "title_ru": value[1],
+            "updated_at": now,
+        }
+    if not rows:
+        return
+
+    stmt = insert(Title)
+    title = func.coalesce(stmt.excluded.title, Title.title)
+    title_ru = func.coalesce(stmt.excluded.title_ru, Title.title_ru)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Title.tmdb_id, Title._type],
+            set_={"title": title, "title_ru": title_ru, "updated_at": stmt.excluded.updated_at},
+            # без изменений строку не переписываем (лишние версии строк и WAL)
+            where=or_(
+                Title.title.is_distinct_from(title),
+                Title.title_ru.is_distinct_from(title_ru),
+            ),
+        ),
+        # в одном порядке ключей: параллельные сборки не ловят взаимную блокировку
+        [rows[key] for key in sorted(rows)],
+    )
+    # в кэш кладём только прочитанное из titles (resolve_titles): транзакцию
+    # вызывающего ещё могут откатить, а в titles могло остаться прежнее название
+    for key in rows:
+        _cache.invalidate(key)
+
+
+async def titles_revision(session: AsyncSession) -> str:
+    """Ревизия словаря названий — max(titles.updated_at), один шаг по индексу.
+
+    Меняется при любой правке или новом названии. Если она сдвинулась,
+    кэш названий процесса сбрасываем: всё, что помечено новой ревизией,
+    собирается уже из свежих названий.
+    """
+    global _revision
+    revision = await session.scalar(_REVISION_QUERY)
+    if revision != _revision:
+        _cache.clear()
+        _revision = revision
+    return revision.isoformat() if revision is not None else ""
+
+
+async def resolve_titles(session: AsyncSession, keys: Iterable[TitleKey]) -> Dict[TitleKey, TitleValue]:
+    """{(tmdb_id, _type): (title, title_ru)}: из кэша процесса, промахи — одним запросом."""
+    out: Dict[TitleKey, TitleValue] = {}
+    missing: List[TitleKey] = []
+    for key in set(keys):
+        found, value = _cache.lookup(key)
+        if found:
+            out[key] = value
+        else:
+            missing.append(key)
+    if not missing:
+        return out
+
+    _cache.record_misses(len(missing))
+    rows = await session.execute(
+        select(Title.tmdb_id, Title._type, Title.title, Title.title_ru)
+        .where(tuple_(Title.tmdb_id, Title._type).in_(missing))
+    )
+    for tmdb_id, _type, title, title_ru in rows:
+        out[(tmdb_id, _type)] = (title, title_ru)
+        _cache.set((tmdb_id, _type), (title, title_ru))
+    return out
+
+
+async def resolve_round_options(session: AsyncSession, rounds: Sequence[Any]) -> List[List[Dict[str, Any]]]:
+    """Варианты ответа раундов в виде [{id,title,title_ru}, ...], по раунду на элемент.
+
+    rounds — GameRound или строки с _type, option_ids и options. Раунды
+    старого формата (option_ids IS NULL) отдаются как есть.
+    """
+    keys = [
+        (tmdb_id, r._type)
+        for r in rounds
+        if r.option_ids is not None
+        for tmdb_id in r.option_ids
+    ]
+    titles = await resolve_titles(session, keys) if keys else {}
+
+    out: List[List[Dict[str, Any]]] = []
+    for r in rounds:
+        if r.option_ids is None:
+            out.append(r.options)
+            continue
+        options = []
+        for tmdb_id in r.option_ids:
+            title, title_ru = titles.get((tmdb_id, r._type), (None, None))
+            options.append({"id": tmdb_id, "title": title, "title_ru": title_ru})
+        out.append(options)
+    return out
@@ -1,9 +1,94 @@
-import os
+import asyncio
+import importlib.util
+import logging
+import time
 import httpx
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Sequence
 
+from app.core.config import (
+    TMDB_SYNC_URL,
+    TMDB_SYNC_TIMEOUT,
+    TMDB_SYNC_CONNECT_TIMEOUT,
+    TMDB_SYNC_MAX_CONNECTIONS,
+    TMDB_SYNC_MAX_KEEPALIVE,
+    TMDB_SYNC_KEEPALIVE_EXPIRY,
+    TMDB_SYNC_HTTP2,
+    TMDB_SYNC_BULK_CHUNK,
+    TMDB_SYNC_BULK_CONCURRENCY,
+    TMDB_SYNC_BULK_RECHECK,
+    TMDB_CACHE_MAXSIZE,
+    TMDB_CACHE_SEARCH_TTL,
+    TMDB_CACHE_MOVIE_TTL,
+    TMDB_CACHE_FRAMES_TTL,
+)
+from app.core.cache import AsyncTTLCache
 
-TMDB_SYNC_URL = os.getenv("TMDB_SYNC_URL", "http://tmdb-sync:8000")
+
+logger = logging.getLogger(__name__)
+
+
+_client: httpx.AsyncClient | None = None
+
+# ответы tmdb-sync; значения общие — не мутировать
+_cache = AsyncTTLCache(maxsize=TMDB_CACHE_MAXSIZE, ttl=TMDB_CACHE_MOVIE_TTL)
+
+# пакетные ручки, которых у tmdb-sync нет (404/405): path -> до какого момента
+# (time.monotonic) их не пробуем; потом проверяем снова (tmdb-sync могли обновить)
+_bulk_unsupported_until: dict[str, float] = {}
+
+# общий лимит запросов get_*_bulk на event loop: пачки всех сборок делят его,
+# а не заводят каждая свой
+_bulk_sem: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def _bulk_semaphore() -> asyncio.Semaphore:
+    global _bulk_sem
+    loop = asyncio.get_running_loop()
+    if _bulk_sem is None or _bulk_sem[0] is not loop:
+        _bulk_sem = (loop, asyncio.Semaphore(max(1, TMDB_SYNC_BULK_CONCURRENCY)))
+    return _bulk_sem[1]
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 только если есть пакет h2, иначе httpx упадёт при создании клиента
+    return TMDB_SYNC_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=TMDB_SYNC_URL,
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=TMDB_SYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=TMDB_SYNC_MAX_KEEPALIVE,
+            keepalive_expiry=TMDB_SYNC_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(TMDB_SYNC_TIMEOUT, connect=TMDB_SYNC_CONNECT_TIMEOUT),
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Общий долгоживущий клиент к tmdb-sync (keep-alive + пул соединений).
+
+    Обычно создаётся на старте приложения (init_client), но на случай
+    скриптов/воркеров без lifecycle-хуков поднимается лениво.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def init_client() -> None:
+    get_client()
+    logger.info("tmdb-sync HTTP client initialized (http2=%s)", _http2_enabled())
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 def _clean(d: dict) -> dict:
@@ -11,12 +96,57 @@ def _clean(d: dict) -> dict:
     return {k: v for k, v in d.items() if v not in (None, "", [], {})}
 
 
-async def tmdb_get(path: str, params: dict | None = None):
-    async with httpx.AsyncClient(timeout=30) as c:
-        r = await c.get(f"{TMDB_SYNC_URL}{path}", params=_clean(params or {}))
+def _cache_ttl(path: str) -> float:
+    if path == "/movies/search":
+        return TMDB_CACHE_SEARCH_TTL
+    if path.endswith("/frames"):
+        return TMDB_CACHE_FRAMES_TTL
+    return TMDB_CACHE_MOVIE_TTL
+
+
+def _cache_key(path: str, params: dict) -> tuple:
+    # bool как в query-строке httpx, остальное — строкой, порядок параметров не важен
+    def norm(v: Any) -> str:
+        if isinstance(v, bool):
+            return "true" if v else "false"
+        return str(v)
+
+    return path, tuple(sorted((k, norm(v)) for k, v in params.items()))
+
+
+def tmdb_cache_stats() -> dict:
+    return _cache.stats()
+
+
+async def tmdb_get(
+    path: str,
+    params: dict | None = None,
+    *,
+    timeout: float | None = None,
+    use_cache: bool = True,
+):
+    """GET к tmdb-sync через общий клиент.
+
+    Ответы кэшируются по (path, params) с TTL по типу ручки; одинаковые
+    параллельные запросы схлопываются в один. timeout переопределяет дефолт
+    на один вызов.
+    """
+    params = _clean(params or {})
+
+    async def load():
+        r = await get_client().get(
+            path,
+            params=params,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        )
         r.raise_for_status()
         return r.json()
 
+    ttl = _cache_ttl(path)
+    if not use_cache or ttl <= 0:
+        return await load()
+    return await _cache.get_or_load(_cache_key(path, params), load, ttl=ttl)
+
 
 async def search_movies(
     *,
@@ -30,6 +160,7 @@ async def search_movies(
     order: str = "desc",
     limit: int = 100,
     skip: int = 0,
+    use_cache: bool = True,
 ):
     params = {
         "_type": _type,
@@ -45,7 +176,51 @@ async def search_movies(
     }
     # выкидываем None, чтобы не смущать FastAPI
     params = {k: v for k, v in params.items() if v is not None}
-    return await tmdb_get("/movies/search", params)
+    return await tmdb_get("/movies/search", params, use_cache=use_cache)
+
+
+async def iter_search_pages(
+    *,
+    limit: int,
+    page_size: int,
+    **filters: Any,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """/movies/search постранично (skip/limit), всего не больше limit документов.
+
+    Следующая страница запрашивается, пока вызывающий код обрабатывает
+    текущую, так что в памяти не больше двух страниц. Мимо кэша: страницы
+    большой выдачи нужны один раз и только вытеснили бы из него горячие ответы.
+    """
+    page_size = max(1, page_size)
+
+    def fetch(skip: int) -> asyncio.Task:
+        return asyncio.create_task(
+            search_movies(
+                **filters,
+                limit=min(page_size, limit - skip),
+                skip=skip,
+                use_cache=False,
+            )
+        )
+
+    skip = 0
+    next_page = fetch(skip) if limit > 0 else None
+    try:
+        while next_page is not None:
+            resp = await next_page
+            next_page = None
+            # tmdb-sync отдаёт {"items": [...]}
+            page = (resp.get("items") if isinstance(resp, dict) else resp) or []
+            requested = min(page_size, limit - skip)
+            skip += len(page)
+            if len(page) >= requested and skip < limit:
+                next_page = fetch(skip)
+            if page:
+                yield page
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+            await asyncio.gather(next_page, return_exceptions=True)
 
 
 async def get_movie(tmdb_id: int, _type: str = "movie") -> Dict[str, Any]:
@@ -56,3 +231,102 @@ async def get_frames(tmdb_id: int, _type: str = "movie") -> List[Dict[str, Any]]
     data = await tmdb_get(f"/movies/{tmdb_id}/frames", {"_type": _type})
     return data.get("frames", [])
 
+
+def _chunks(ids: Sequence[int], size: int) -> List[List[int]]:
+    size = max(1, size)
+    return [list(ids[i:i + size]) for i in range(0, len(ids), size)]
+
+
+async def _post_bulk(path: str, ids: List[int], _type: str) -> Any | None:
+    """POST пакетной ручки; None — если у tmdb-sync такой ручки нет.
+
+    «Нет ручки» запоминаем только по 404/405 и на TMDB_SYNC_BULK_RECHECK
+    секунд; прочие ошибки (таймауты, 5xx) пробрасываются и ни на что не влияют.
+    """
+    if _bulk_unsupported_until.get(path, 0.0) > time.monotonic():
+        return None
+    r = await get_client().post(path, json={"ids": ids, "_type": _type})
+    if r.status_code in (404, 405):
+        logger.info("tmdb-sync has no %s, falling back to single requests", path)
+        _bulk_unsupported_until[path] = time.monotonic() + TMDB_SYNC_BULK_RECHECK
+        return None
+    r.raise_for_status()
+    _bulk_unsupported_until.pop(path, None)
+    return r.json()
+
+
+async def _fetch_bulk(
+    ids: Sequence[int],
+    *,
+    single_path: Callable[[int], str],
+    _type: str,
+    bulk_path: str,
+    parse_bulk: Callable[[Any], Dict[int, Any]],
+) -> Dict[int, Any]:
+    """Общая часть get_*_bulk: кэш -> пакетная ручка по чанкам -> одиночные запросы.
+
+    Значения кладутся в тот же кэш, что и у одиночных tmdb_get, поэтому
+    пакетные и одиночные вызовы друг другу помогают. Ненайденные id в
+    результат не попадают.
+    """
+    params = {"_type": _type}
+    ttl = _cache_ttl(single_path(0))
+    out: Dict[int, Any] = {}
+    missing: List[int] = []
+    for tmdb_id in dict.fromkeys(ids):
+        found, value = _cache.lookup(_cache_key(single_path(tmdb_id), params))
+        if found:
+            out[tmdb_id] = value
+        else:
+            missing.append(tmdb_id)
+
+    sem = _bulk_semaphore()
+
+    async def load_single(tmdb_id: int) -> None:
+        async with sem:
+            try:
+                out[tmdb_id] = await tmdb_get(single_path(tmdb_id), params)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+
+    async def load_chunk(chunk: List[int]) -> None:
+        async with sem:
+            data = await _post_bulk(bulk_path, chunk, _type)
+        if data is None:
+            await asyncio.gather(*(load_single(tmdb_id) for tmdb_id in chunk))
+            return
+        _cache.record_misses(len(chunk))
+        for tmdb_id, value in parse_bulk(data).items():
+            out[tmdb_id] = value
+            _cache.set(_cache_key(single_path(tmdb_id), params), value, ttl)
+
+    await asyncio.gather(*(load_chunk(c) for c in _chunks(missing, TMDB_SYNC_BULK_CHUNK)))
+    return out
+
+
+async def get_movies_bulk(ids: Sequence[int], _type: str = "movie") -> Dict[int, Dict[str, Any]]:
+    """{tmdb_id: документ фильма} одним-несколькими запросами вместо N штук."""
+    return await _fetch_bulk(
+        ids,
+        single_path=lambda tmdb_id: f"/movies/{tmdb_id}",
+        _type=_type,
+        bulk_path="/movies/bulk",
+        # {"items": [doc, ...]}
+        parse_bulk=lambda data: {doc["id"]: doc for doc in data.get("items") or []},
+    )
+
+
+async def get_frames_bulk(ids: Sequence[int], _type: str = "movie") -> Dict[int, List[Dict[str, Any]]]:
+    """{tmdb_id: кадры} одним-несколькими запросами вместо N штук."""
+    data = await _fetch_bulk(
+        ids,
+        single_path=lambda tmdb_id: f"/movies/{tmdb_id}/frames",
+        _type=_type,
+        bulk_path="/movies/frames/bulk",
+        # {"items": [{"id": ..., "frames": [...]}, ...]} -> в кэше как у одиночной ручки
+        parse_bulk=lambda data: {
+            row["id"]: {"frames": row.get("frames") or []} for row in data.get("items") or []
+        },
+    )
+    return {tmdb_id: value.get("frames", []) for tmdb_id, value in data.items()}
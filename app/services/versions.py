@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+
+import asyncpg
+from sqlalchemy import Select, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import AsyncTTLCache
+from app.core.config import LATEST_VERSION_CACHE_SIZE, LATEST_VERSION_CACHE_TTL, PG_DSN
+from app.models.collection_models import Collection, CollectionItem, CollectionVersion
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LatestVersion:
+    """Последняя опубликованная версия коллекции (то, что нужно для создания игры)."""
+    id: int
+    version: int
+    size: int
+
+
+# collection_id -> LatestVersion. Публикация сбрасывает запись в своём процессе сразу,
+# в остальных — по NOTIFY (VERSION_CHANNEL); TTL — страховка, если уведомление потерялось
+_latest_cache = AsyncTTLCache(maxsize=LATEST_VERSION_CACHE_SIZE, ttl=LATEST_VERSION_CACHE_TTL)
+
+# канал LISTEN/NOTIFY: payload — id коллекции, у которой опубликована новая версия
+VERSION_CHANNEL = "collection_published"
+
+_listener: asyncpg.Connection | None = None
+
+
+def _latest_version_query(collection_id: int) -> Select:
+    return (
+        select(CollectionVersion.id, CollectionVersion.version, CollectionVersion.size)
+        .join(Collection, Collection.latest_published_version_id == CollectionVersion.id)
+        .where(Collection.id == collection_id)
+    )
+
+
+async def get_latest_version(session: AsyncSession, collection_id: int) -> LatestVersion | None:
+    """Последняя опубликованная версия по указателю collections.latest_published_version_id.
+
+    None — коллекции нет или у неё ещё нет опубликованных версий.
+    """
+    async def load() -> LatestVersion | None:
+        row = (await session.execute(_latest_version_query(collection_id))).first()
+        return LatestVersion(id=row.id, version=row.version, size=row.size) if row else None
+
+    latest = await _latest_cache.get_or_load(collection_id, load)
+    if latest is None:
+        # «версии нет» не запоминаем: первая публикация должна быть видна сразу
+        _latest_cache.invalidate(collection_id)
+    return latest
+
+
+def invalidate_latest_version(collection_id: int) -> None:
+    _latest_cache.invalidate(collection_id)
+
+
+async def notify_published(session: AsyncSession, collection_id: int) -> None:
+    """Сбросить кэш последней версии в других процессах: NOTIFY уйдёт с коммитом сессии."""
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": VERSION_CHANNEL, "payload": str(collection_id)},
+    )
+
+
+def _on_published(_conn, _pid, _channel, payload: str) -> None:
+    try:
+        invalidate_latest_version(int(payload))
+    except ValueError:
+        logger.warning("Bad %s payload: %r", VERSION_CHANNEL, payload)
+
+
+async def start_version_listener() -> None:
+    """Слушаем публикации версий; без соединения кэш просто доживает TTL."""
+    global _listener
+    if _listener is not None:
+        return
+    try:
+        # отдельное соединение под LISTEN: пулы его не подходят (соединение вернут в пул)
+        _listener = await asyncpg.connect(dsn=PG_DSN)
+        await _listener.add_listener(VERSION_CHANNEL, _on_published)
+    except Exception:
+        logger.exception("Latest version listener failed to start, relying on TTL")
+        if _listener is not None:
+            await _listener.close()
+        _listener = None
+
+
+async def stop_version_listener() -> None:
+    global _listener
+    if _listener is not None:
+        await _listener.close()
+        _listener = None
+
+
+def version_items_query(
+    version: CollectionVersion,
+    *,
+    after: int = 0,
+    limit: int | None = None,
+) -> Select:
+    """Полный список items версии по ord, с учётом дельты.
+
+    Полный снимок (base_version_id IS NULL) читается как есть. У дельты
+    позиция берётся из самой версии, если она там есть, иначе из базового
+    снимка; позиции за size (хвост, которого больше нет) отбрасываются.
+    after/limit — keyset-страница: ord > after, не больше limit строк.
+    """
+    if version.base_version_id is None:
+        stmt = (
+            select(CollectionItem)
+            .where(CollectionItem.version_id == version.id, CollectionItem.ord > after)
+            .order_by(CollectionItem.ord)
+        )
+    else:
+        stmt = (
+            select(CollectionItem)
+            .where(
+                CollectionItem.version_id.in_((version.id, version.base_version_id)),
+                CollectionItem.ord > after,
+                CollectionItem.ord <= version.size,
+            )
+            .distinct(CollectionItem.ord)
+            .order_by(CollectionItem.ord, (CollectionItem.version_id == version.id).desc())
+        )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
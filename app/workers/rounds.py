@@ -0,0 +1,113 @@
+"""Фоновый воркер сборки: очередь компиляций коллекций, пул готовых игр
+и обновление манифестов кадров.
+
+    python -m app.workers.rounds [--processes N]
+
+Каждый процесс — свой event loop, свой HTTP-клиент к tmdb-sync и свой пул
+соединений к Postgres. Задачи берутся из Postgres (compile_jobs, популярные
+версии для game_templates, устаревшие frame_manifests), так что процессы
+можно добавлять и на других нодах. Процессы будят NOTIFY из API, без них —
+опрос по таймерам.
+API эту работу не делает (BACKGROUND_WORKERS_IN_API=0 по умолчанию).
+
+Раунды конкретной игры воркер не собирает: POST /games при пустом пуле
+и /games/stream собирают их в запросе API, воркер только наполняет пул
+шаблонов, чтобы такие промахи были редкими.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+import asyncpg
+
+from app.core.config import PG_DSN, ROUND_WORKER_PROCESSES
+from app.core.db import dispose_engine
+from app.services.compile_jobs import (
+    COMPILE_CHANNEL,
+    start_compile_workers,
+    stop_compile_workers,
+    wake_workers,
+)
+from app.services.frame_manifests import start_frame_refresher, stop_frame_refresher
+from app.services.game_pool import REFILL_CHANNEL, request_refill, start_refiller, stop_refiller
+from app.services.tmdb_sync_client import close_client, init_client
+
+
+logger = logging.getLogger("app.workers.rounds")
+
+
+async def serve() -> None:
+    """Один процесс воркера: работает до SIGTERM/SIGINT."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await init_client()
+
+    # отдельное соединение под LISTEN: пулы его не подходят (соединение вернут в пул)
+    listener = await asyncpg.connect(dsn=PG_DSN)
+    await listener.add_listener(COMPILE_CHANNEL, lambda *_: wake_workers())
+    await listener.add_listener(REFILL_CHANNEL, lambda *_: request_refill())
+
+    start_compile_workers()
+    start_refiller()
+    start_frame_refresher()
+    logger.info("Round worker started")
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Round worker stopping")
+        await stop_compile_workers()
+        await stop_refiller()
+        await stop_frame_refresher()
+        await listener.close()
+        await close_client()
+        await dispose_engine()
+
+
+def _run_process() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(name)s: %(message)s")
+    asyncio.run(serve())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Kadracoon round/compile worker")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=ROUND_WORKER_PROCESSES,
+        help="сколько процессов запустить (по умолчанию ROUND_WORKER_PROCESSES)",
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_process()
+        return
+
+    # spawn: дочерние процессы не наследуют event loop и соединения родителя
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_run_process, name=f"rounds-{i + 1}")
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+
+    def forward(signum, _frame):
+        for p in procs:
+            if p.is_alive():
+                p.terminate()  # SIGTERM — процесс остановится штатно
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
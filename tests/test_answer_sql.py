@@ -0,0 +1,126 @@
+"""_ANSWER_SQL и пакетная запись ответов на живом Postgres (фикстура pg в conftest)."""
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from app.models.collection_models import Collection, CollectionVersion
+from app.models.game import Game, GameRound
+from app.models.title import Title
+from app.services.games import _ANSWER_NEXT_SQL, _ANSWER_SQL, write_answers
+
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+async def _version(pg) -> int:
+    cid = await pg.scalar(
+        insert(Collection).values(name="c", slug="c", rule_json={}).returning(Collection.id)
+    )
+    return await pg.scalar(
+        insert(CollectionVersion).values(collection_id=cid, version=1, size=2).returning(CollectionVersion.id)
+    )
+
+
+async def _game(pg, *, version_id: int | None = None, legacy_second_round: bool = False) -> int:
+    """Игра из двух раундов; правильный вариант — индекс 1."""
+    if version_id is None:
+        version_id = await _version(pg)
+        await pg.execute(
+            insert(Title),
+            [{"tmdb_id": i, "_type": "movie", "title": f"T{i}", "title_ru": None, "updated_at": NOW} for i in range(1, 5)],
+        )
+    gid = await pg.scalar(
+        insert(Game)
+        .values(version_id=version_id, mode="ONE_FRAME_FOUR_TITLES", total_rounds=2, score=0,
+                answered_count=0, correct_count=0, created_at=NOW, built_at=NOW)
+        .returning(Game.id)
+    )
+    legacy = [{"id": i, "title": f"Old {i}", "title_ru": None} for i in (4, 3, 2, 1)]
+    await pg.execute(
+        insert(GameRound),
+        [
+            {"game_id": gid, "ord": 1, "correct_tmdb_id": 2, "_type": "movie", "frame_paths": ["/1.jpg"],
+             "option_ids": [1, 2, 3, 4], "options": None, "correct_index": 1},
+            {"game_id": gid, "ord": 2, "correct_tmdb_id": 3, "_type": "movie", "frame_paths": ["/2.jpg"],
+             "option_ids": None if legacy_second_round else [4, 3, 2, 1],
+             "options": legacy if legacy_second_round else None, "correct_index": 1},
+        ],
+    )
+    return gid
+
+
+async def _answer(pg, gid: int, ord: int, answer_index: int, sql=_ANSWER_SQL):
+    return (
+        await pg.execute(sql, {"game_id": gid, "ord": ord, "answer_index": answer_index, "now": NOW})
+    ).one()
+
+
+async def _counters(pg, gid: int):
+    return (
+        await pg.execute(select(Game.score, Game.answered_count, Game.correct_count, Game.finished_at).where(Game.id == gid))
+    ).one()
+
+
+async def test_repeated_answer_is_not_counted_twice(pg):
+    gid = await _game(pg)
+
+    first = await _answer(pg, gid, 1, 1)
+    assert (first.new_is_correct, first.new_score) == (True, 1)
+
+    # повтор (в том числе с другим вариантом) ничего не меняет и отдаёт прежний ответ
+    again = await _answer(pg, gid, 1, 0)
+    assert again.new_is_correct is None
+    assert (again.answered_index, again.is_correct, again.score) == (1, True, 1)
+    assert await _counters(pg, gid) == (1, 1, 1, None)
+
+
+async def test_invalid_index_is_not_recorded(pg):
+    gid = await _game(pg)
+    for bad in (-1, 4):
+        row = await _answer(pg, gid, 1, bad)
+        assert row.new_is_correct is None and row.answered_index is None
+        assert row.n_options == 4
+    assert (await _counters(pg, gid)).answered_count == 0
+
+
+async def test_last_answer_finishes_game_once(pg):
+    gid = await _game(pg)
+    await _answer(pg, gid, 1, 0)
+    last = await _answer(pg, gid, 2, 1)
+    assert last.finished_at is None and last.new_finished_at == NOW
+    assert await _counters(pg, gid) == (1, 2, 1, NOW)
+
+    again = await _answer(pg, gid, 2, 1)
+    assert again.new_finished_at is None and again.finished_at == NOW
+
+
+async def test_answer_next_resolves_titles_in_same_statement(pg):
+    gid = await _game(pg)
+    row = await _answer(pg, gid, 1, 1, _ANSWER_NEXT_SQL)
+    assert row.next_ord == 2
+    assert row.next_options == [{"id": i, "title": f"T{i}", "title_ru": None} for i in (4, 3, 2, 1)]
+
+
+async def test_answer_next_falls_back_to_legacy_options(pg):
+    gid = await _game(pg, legacy_second_round=True)
+    row = await _answer(pg, gid, 1, 1, _ANSWER_NEXT_SQL)
+    assert [o["title"] for o in row.next_options] == ["Old 4", "Old 3", "Old 2", "Old 1"]
+
+
+async def test_batch_write_is_idempotent(pg):
+    gid = await _game(pg)
+    batch = [
+        {"game_id": gid, "ord": 1, "answered_index": 1, "is_correct": True, "answered_at": NOW},
+        {"game_id": gid, "ord": 2, "answered_index": 0, "is_correct": False, "answered_at": NOW},
+    ]
+    # повтор упавшей (на самом деле закоммиченной) пачки не удваивает счётчики
+    await write_answers(pg, batch)
+    await write_answers(pg, batch)
+    assert await _counters(pg, gid) == (1, 2, 1, NOW)
+
+    # ответ, уже записанный через _ANSWER_SQL, пачка не перезаписывает
+    gid2 = await _game(pg, version_id=await pg.scalar(select(Game.version_id).where(Game.id == gid)))
+    await _answer(pg, gid2, 1, 0)
+    await write_answers(pg, [{**batch[0], "game_id": gid2}])
+    assert await _counters(pg, gid2) == (0, 1, 0, None)
+
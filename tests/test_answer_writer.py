@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services.answer_writer import AnswerWriteBehind
+
+
+def answer(game_id: int, ord: int) -> dict:
+    return {
+        "game_id": game_id,
+        "ord": ord,
+        "answered_index": 0,
+        "is_correct": True,
+        "answered_at": datetime(2026, 1, 1),
+    }
+
+
+async def test_group_commit_acks_after_commit(db):
+    writer = AnswerWriteBehind(durability="group", max_delay=60, group_delay=0.01)
+    writer.start()
+    try:
+        # три ответа — одна пачка, подтверждение только после её коммита
+        await asyncio.gather(*(writer.commit(answer(1, o)) for o in (1, 2, 3)))
+        assert [a["ord"] for a in db.committed] == [1, 2, 3]
+        assert writer.stats()["batches"] == 1
+        assert len(writer) == 0
+    finally:
+        await writer.stop()
+
+
+async def test_group_delay_holds_for_answers_during_and_after_flush(db):
+    writer = AnswerWriteBehind(durability="group", max_delay=0.5, group_delay=0.01)
+    writer.start()
+    loop = asyncio.get_running_loop()
+    try:
+        db.delay = 0.05
+        first = asyncio.create_task(writer.commit(answer(1, 1)))
+        await asyncio.sleep(0.03)  # первая пачка пишется
+        # ответ во время записи: его таймер срабатывает, пока идёт flush
+        await writer.commit(answer(1, 2))
+        await first
+
+        db.delay = 0.0
+        await asyncio.sleep(0.05)  # фоновая запись успокоилась
+        # и после неё — снова group_delay, а не max_delay
+        for ord in (3, 4):
+            started = loop.time()
+            await writer.commit(answer(1, ord))
+            assert loop.time() - started < 0.2
+        assert [a["ord"] for a in db.committed] == [1, 2, 3, 4]
+    finally:
+        await writer.stop()
+
+
+async def test_ack_mode_returns_before_commit(db):
+    writer = AnswerWriteBehind(durability="ack", max_delay=60)
+    await writer.commit(answer(1, 1))
+    assert db.committed == [] and writer.has_pending(1)
+
+    await writer.stop()  # остаток дописывается при остановке
+    assert [a["ord"] for a in db.committed] == [1]
+
+
+async def test_failed_batch_fails_waiters_and_is_retried(db):
+    writer = AnswerWriteBehind(durability="group", max_delay=60, group_delay=0)
+    db.fail = True
+    fut = writer.add(answer(1, 1))
+    with pytest.raises(ConnectionError):
+        await writer.flush()
+    with pytest.raises(ConnectionError):
+        await fut
+    assert writer.has_pending(1) and writer.stats()["failures"] == 1
+
+    # ответ остался в очереди и уходит со следующей пачкой
+    db.fail = False
+    await writer.flush()
+    assert [a["ord"] for a in db.committed] == [1]
+    assert not writer.has_pending(1)
+
+
+async def test_retry_waits_for_pending_commit(db):
+    writer = AnswerWriteBehind(durability="group", max_delay=60, group_delay=60)
+    fut = writer.add(answer(1, 1))
+
+    # повтор того же ответа не подтверждается, пока исходный не закоммичен
+    retry = asyncio.create_task(writer.wait_committed(1))
+    await asyncio.sleep(0.01)
+    assert not retry.done()
+
+    await writer.flush()
+    await retry
+    assert fut.done() and [a["ord"] for a in db.committed] == [1]
+
+
+async def test_retry_after_failed_batch_flushes_itself(db):
+    writer = AnswerWriteBehind(durability="group", max_delay=60, group_delay=60)
+    db.fail = True
+    writer.add(answer(1, 1))
+    with pytest.raises(ConnectionError):
+        await writer.flush()
+
+    # у упавшего ответа нет future — повтор пишет пачку сам
+    db.fail = False
+    await writer.wait_committed(1)
+    assert [a["ord"] for a in db.committed] == [1]
+    await writer.wait_committed(2)  # по другой игре ждать нечего
+    assert db.writes == 2
+
+
+async def test_flush_through_callers_session(db):
+    writer = AnswerWriteBehind(durability="ack", max_delay=60)
+    writer.add(answer(1, 1))
+    session = db.sessionmaker()()
+    await writer.flush(session)
+    assert [a["ord"] for a in db.committed] == [1]
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import AsyncTTLCache
+
+
+async def test_concurrent_loads_are_coalesced():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    calls = 0
+    release = asyncio.Event()
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"id": 1}
+
+    waiters = [asyncio.create_task(cache.get_or_load("movie:1", loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["inflight"]) == (1, 4, 0)
+
+    assert await cache.get_or_load("movie:1", loader) is results[0]
+    assert calls == 1 and cache.stats()["hits"] == 1
+
+
+async def test_failed_load_is_shared_and_not_cached():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    calls = 0
+    release = asyncio.Event()
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        raise RuntimeError("tmdb-sync down")
+
+    waiters = [asyncio.create_task(cache.get_or_load("k", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def ok():
+        return 42
+
+    # ошибку не запомнили: следующий запрос загружает заново
+    assert await cache.get_or_load("k", ok) == 42
+
+
+async def test_cancelled_loader_does_not_fail_waiters():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "fresh"
+
+    owner = asyncio.create_task(cache.get_or_load("k", slow))
+    await started.wait()
+    waiter = asyncio.create_task(cache.get_or_load("k", fast))
+    await asyncio.sleep(0)
+    owner.cancel()
+
+    # ждущий не получает чужую отмену, а загружает сам
+    assert await waiter == "fresh"
+    with pytest.raises(asyncio.CancelledError):
+        await owner
+
+
+async def test_entries_expire_after_ttl():
+    cache = AsyncTTLCache(maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == (True, 1)
+
+    await asyncio.sleep(0.06)
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+    assert len(cache) == 1
+
+
+def test_lru_eviction_and_disabled_cache():
+    cache = AsyncTTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")        # a — свежее b
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+    off = AsyncTTLCache(maxsize=0, ttl=60)
+    off.set("a", 1)
+    assert len(off) == 0
@@ -0,0 +1,13 @@
+from app.services import frame_manifests
+
+
+async def test_fetch_keeps_only_ids_present_in_response(monkeypatch):
+    async def get_frames_bulk(ids, *, _type):
+        # 2 — без кадров, 3 — tmdb-sync не вернул
+        return {1: [{"path": "/a.jpg"}, {"path": None}, {"path": "/b.jpg"}], 2: []}
+
+    monkeypatch.setattr(frame_manifests, "get_frames_bulk", get_frames_bulk)
+    assert await frame_manifests.fetch_frame_manifests([1, 2, 3], "movie") == {
+        1: ["/a.jpg", "/b.jpg"],
+        2: [],
+    }
@@ -0,0 +1,33 @@
+import asyncio
+import random
+
+from app.services import games
+
+
+class BrokenSession:
+    """Postgres, который падает на финальном UPDATE игры."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        raise ConnectionError("postgres down")
+
+    async def commit(self):
+        pass
+
+
+async def test_stream_gets_done_when_finalize_fails(monkeypatch):
+    async def no_rounds(*args, **kwargs):
+        return
+        yield
+
+    monkeypatch.setattr(games, "iter_round_specs", no_rounds)
+    monkeypatch.setattr(games, "get_sessionmaker", lambda: BrokenSession)
+
+    events: asyncio.Queue = asyncio.Queue()
+    await games._build_game_in_background(7, "FOUR_FRAMES_ONE_TITLE", [], None, {}, random.Random(1), events)
+    assert events.get_nowait() == {"type": "done", "total_rounds": 0}
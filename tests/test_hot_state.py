@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.services import hot_state
+from app.services.answer_writer import AnswerWriteBehind
+from app.services.hot_state import MemoryHotStateStore, answer_hot
+
+
+@pytest.fixture
+async def hot(monkeypatch, db, make_hot_game):
+    store = MemoryHotStateStore(maxsize=10, ttl=60)
+    await store.put_if_absent(make_hot_game("Movie"))
+    writer = AnswerWriteBehind(durability="group", max_delay=60, group_delay=60)
+    monkeypatch.setattr(hot_state, "_store", store)
+    monkeypatch.setattr(hot_state, "_writer", writer)
+    return db, writer
+
+
+async def test_retried_answer_waits_for_group_commit(hot):
+    db, writer = hot
+    first = asyncio.create_task(answer_hot(None, game_id=7, ord=1, answer_index=0))
+    await asyncio.sleep(0.01)
+    # повтор приходит, пока исходный ответ ждёт коммита пачки
+    retry = asyncio.create_task(answer_hot(None, game_id=7, ord=1, answer_index=2))
+    await asyncio.sleep(0.01)
+    assert not first.done() and not retry.done()
+
+    await writer.flush()
+    a, b = await asyncio.gather(first, retry)
+    assert (a.is_correct, a.score) == (True, 1)
+    assert (b.is_correct, b.score) == (True, 1)  # повтор отдаёт исходный ответ
+    assert [x["ord"] for x in db.committed] == [1]
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    monkeypatch.setattr(hot_state, "HOT_STATE_BACKEND", "memory")
+    monkeypatch.setattr(hot_state, "HOT_STATE_STICKY_ROUTING", True)
+    monkeypatch.setattr(hot_state, "WEB_CONCURRENCY", 1)
+    monkeypatch.setattr(hot_state.sys, "argv", ["uvicorn", "app.main:app"])
+    monkeypatch.delenv("GUNICORN_CMD_ARGS", raising=False)
+    return monkeypatch
+
+
+def test_memory_store_refuses_several_workers(memory_backend):
+    assert isinstance(hot_state._make_store(), MemoryHotStateStore)
+
+    memory_backend.setattr(hot_state, "WEB_CONCURRENCY", 4)
+    with pytest.raises(ValueError, match="WEB_CONCURRENCY"):
+        hot_state._make_store()
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [["--workers", "4"], ["--workers=4"], ["-w", "4"], ["-w4"]],
+    ids=["workers", "workers=", "-w", "-wN"],
+)
+def test_memory_store_sees_workers_on_command_line(memory_backend, argv):
+    memory_backend.setattr(hot_state.sys, "argv", ["uvicorn", "app.main:app", *argv])
+    with pytest.raises(ValueError, match="got 4"):
+        hot_state._make_store()
+
+
+def test_memory_store_sees_gunicorn_cmd_args(memory_backend):
+    memory_backend.setenv("GUNICORN_CMD_ARGS", "--bind 0.0.0.0:8000 --workers 3")
+    with pytest.raises(ValueError, match="got 3"):
+        hot_state._make_store()
+
+
+def test_memory_store_requires_sticky_routing_ack(memory_backend):
+    memory_backend.setattr(hot_state, "HOT_STATE_STICKY_ROUTING", False)
+    with pytest.raises(ValueError, match="HOT_STATE_STICKY_ROUTING"):
+        hot_state._make_store()
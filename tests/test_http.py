@@ -0,0 +1,37 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.http import FastJSONResponse, add_compression, json_line, ndjson_response
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    add_compression(app, skip_paths={"/games/stream"})
+    payload = {"rounds": [{"ord": i, "frame_paths": ["/a.jpg"] * 4} for i in range(200)]}
+
+    @app.get("/games/1/rounds")
+    async def rounds():
+        return FastJSONResponse(payload)
+
+    @app.post("/games/stream")
+    async def stream():
+        async def lines():
+            for r in payload["rounds"]:
+                yield json_line(r)
+        return ndjson_response(lines())
+
+    return app
+
+
+def test_json_is_compressed_stream_is_not():
+    client = TestClient(_app())
+    headers = {"Accept-Encoding": "gzip"}
+
+    r = client.get("/games/1/rounds", headers=headers)
+    assert r.headers["content-encoding"] in {"gzip", "br"}
+    assert len(r.json()["rounds"]) == 200
+
+    r = client.post("/games/stream", headers=headers)
+    assert "content-encoding" not in r.headers
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert len(r.text.splitlines()) == 200
@@ -0,0 +1,101 @@
+"""Планы горячих запросов: каждый должен идти по своему индексу.
+
+Нужен живой Postgres (TEST_PG_DSN, фикстура pg в conftest): схема создаётся
+во временной схеме внутри транзакции и откатывается.
+Таблицы пустые, поэтому seqscan выключаем: проверяем, что индекс вообще
+подходит запросу, а не выбор планировщика на конкретных данных.
+Запросы берём те же, что выполняет приложение, а не их копии.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.services.collections import _max_version_query
+from app.services.compile_jobs import _claim_job_query
+from app.services.frame_manifests import _claim_stale_query
+from app.services.game_pool import _claim_template_query, _hot_targets_query
+from app.services.games import _ANSWER_NEXT_SQL, _ANSWER_SQL
+from app.services.titles import _REVISION_QUERY
+from app.services.versions import _latest_version_query
+
+NOW = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+async def conn(pg):
+    await pg.execute(text("SET LOCAL enable_seqscan = off"))
+    return pg
+
+
+def compiled(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+async def explain(conn, stmt, params: dict | None = None) -> str:
+    if params is None:
+        rows = await conn.exec_driver_sql("EXPLAIN " + compiled(stmt))
+    else:
+        # _ANSWER_NEXT_SQL — TextualSelect над text()
+        rows = await conn.execute(text("EXPLAIN " + getattr(stmt, "element", stmt).text), params)
+    return "\n".join(r[0] for r in rows)
+
+
+async def test_claim_template_uses_version_mode_index(conn):
+    plan = await explain(conn, _claim_template_query(1, "ONE_FRAME_FOUR_TITLES"))
+    assert "ix_game_templates_version_mode" in plan
+
+
+async def test_claim_job_uses_pending_index(conn):
+    plan = await explain(conn, _claim_job_query(NOW, NOW))
+    assert "ix_compile_jobs_pending" in plan
+
+
+async def test_hot_targets_use_created_at_index(conn):
+    plan = await explain(conn, _hot_targets_query(NOW))
+    assert "ix_games_created_at" in plan
+
+
+async def test_stale_frame_manifests_use_fetched_at_index(conn):
+    plan = await explain(conn, _claim_stale_query(NOW, NOW, 500))
+    assert "ix_frame_manifests_fetched_at" in plan
+
+
+async def test_next_version_uses_unique_constraint(conn):
+    # max(version) по коллекции (compute_next_version) — по uq_collection_version
+    plan = await explain(conn, _max_version_query(1))
+    assert "uq_collection_version" in plan
+
+
+async def test_latest_version_is_pk_keyed(conn):
+    # указатель collections.latest_published_version_id: два чтения по PK
+    plan = await explain(conn, _latest_version_query(1))
+    assert "collections_pkey" in plan
+    assert "collection_versions_pkey" in plan
+    assert "Seq Scan" not in plan
+
+
+async def test_titles_revision_uses_updated_at_index(conn):
+    # ETag страницы раундов: max(updated_at) — один шаг по индексу
+    plan = await explain(conn, _REVISION_QUERY)
+    assert "ix_titles_updated_at" in plan
+
+
+@pytest.mark.parametrize("stmt", [_ANSWER_SQL, _ANSWER_NEXT_SQL], ids=["answer", "answer_next"])
+async def test_answer_is_pk_keyed(conn, stmt):
+    # раунды отвечаются и читаются только по PK (game_id, ord): индекс по
+    # answered_index не нужен и сделал бы UPDATE ответа не-HOT
+    plan = await explain(conn, stmt, {"game_id": 1, "ord": 1, "answer_index": 0, "now": NOW})
+    assert "game_rounds_pkey" in plan
+    assert "games_pkey" in plan
+    assert "Seq Scan" not in plan
+
+
+async def test_game_rounds_have_no_answered_index(conn):
+    indexes = (
+        await conn.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE schemaname = 'kadracoon_test' AND tablename = 'game_rounds'")
+        )
+    ).scalars().all()
+    assert not [d for d in indexes if "answered_index" in d]
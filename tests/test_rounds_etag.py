@@ -0,0 +1,100 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import game as game_api
+from app.core.db import get_session
+from app.services import hot_state
+from app.services.hot_state import MemoryHotStateStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # игра в горячем хранилище: страница раундов собирается без Postgres
+    store = MemoryHotStateStore(maxsize=10, ttl=60)
+    monkeypatch.setattr(hot_state, "_store", store)
+
+    async def no_db():
+        yield None
+
+    app = FastAPI()
+    app.include_router(game_api.router)
+    app.dependency_overrides[get_session] = no_db
+    with TestClient(app) as client:
+        client.store = store
+        yield client
+
+
+async def _put(store, game):
+    await store.delete(game.id)
+    await store.put_if_absent(game)
+
+
+def test_rounds_page_revalidates_by_titles_revision(client, make_hot_game):
+    client.portal.call(_put, client.store, make_hot_game("Movie"))
+
+    r = client.get("/games/7/rounds")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    assert "immutable" not in r.headers["cache-control"]
+    assert [rd["ord"] for rd in r.json()["rounds"]] == [1, 2]
+
+    r = client.get("/games/7/rounds", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag and r.content == b""
+    assert client.get("/games/7/rounds", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    # другая страница — другой ETag
+    assert client.get("/games/7/rounds?after=1").headers["etag"] != etag
+
+    # исправили название — новая ревизия titles, старый ETag больше не подходит
+    client.portal.call(_put, client.store, make_hot_game("Fixed", titles_revision="r2"))
+    r = client.get("/games/7/rounds", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert r.json()["rounds"][0]["options"][0]["title"] == "Fixed 0"
+
+
+class RoundsSession:
+    """Postgres для пути без горячего хранилища: игра, ревизия titles и раунды."""
+
+    def __init__(self):
+        self.revision = datetime(2026, 1, 1)
+        self.rounds_read = 0
+
+    async def get(self, model, game_id):
+        return SimpleNamespace(id=game_id, mode="ONE_FRAME_FOUR_TITLES", total_rounds=1, built_at=datetime(2026, 1, 1))
+
+    async def scalar(self, stmt):
+        return self.revision
+
+    async def execute(self, stmt):
+        self.rounds_read += 1
+        return SimpleNamespace(
+            all=lambda: [SimpleNamespace(ord=1, _type="movie", frame_paths=["/1.jpg"], option_ids=None, options=[])]
+        )
+
+
+def test_rounds_etag_is_checked_before_reading_rounds(monkeypatch):
+    monkeypatch.setattr(hot_state, "_store", None)
+    session = RoundsSession()
+
+    async def fake_db():
+        yield session
+
+    app = FastAPI()
+    app.include_router(game_api.router)
+    app.dependency_overrides[get_session] = fake_db
+    with TestClient(app) as client:
+        etag = client.get("/games/7/rounds").headers["etag"]
+        assert session.rounds_read == 1
+
+        r = client.get("/games/7/rounds", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert session.rounds_read == 1  # раунды и названия не читали
+
+        session.revision = datetime(2026, 1, 2)
+        assert client.get("/games/7/rounds", headers={"If-None-Match": etag}).status_code == 200
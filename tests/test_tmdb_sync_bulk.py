@@ -0,0 +1,192 @@
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services import tmdb_sync_client as tsc
+from app.services.round_builder import iter_round_specs
+
+
+class FakeTmdbSync:
+    """tmdb-sync на httpx.MockTransport: считает запросы и одновременные запросы."""
+
+    def __init__(self, *, bulk: bool = True, bulk_status: int = 404, delay: float = 0.0):
+        self.bulk = bulk
+        self.bulk_status = bulk_status
+        self.delay = delay
+        self.requests: list[tuple[str, str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.missing: set[int] = set()
+
+    def doc(self, tmdb_id: int) -> dict:
+        return {"id": tmdb_id, "title": f"Movie {tmdb_id}", "genre_ids": [18], "release_date": "1999-01-01"}
+
+    def frames(self, tmdb_id: int) -> list[dict]:
+        return [{"path": f"/{tmdb_id}-{i}.jpg"} for i in range(6)]
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requests.append((request.method, path))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if request.method == "POST":
+                if not self.bulk:
+                    return httpx.Response(self.bulk_status)
+                ids = [i for i in json.loads(request.content)["ids"] if i not in self.missing]
+                if path == "/movies/bulk":
+                    return httpx.Response(200, json={"items": [self.doc(i) for i in ids]})
+                return httpx.Response(200, json={"items": [{"id": i, "frames": self.frames(i)} for i in ids]})
+            if path == "/movies/search":
+                return httpx.Response(200, json={"items": [self.doc(1000 + i) for i in range(50)]})
+            parts = path.strip("/").split("/")
+            tmdb_id = int(parts[1])
+            if tmdb_id in self.missing:
+                return httpx.Response(404)
+            if parts[-1] == "frames":
+                return httpx.Response(200, json={"frames": self.frames(tmdb_id)})
+            return httpx.Response(200, json=self.doc(tmdb_id))
+        finally:
+            self.in_flight -= 1
+
+    def count(self, method: str, prefix: str = "") -> int:
+        return sum(1 for m, p in self.requests if m == method and p.startswith(prefix))
+
+
+@pytest.fixture
+async def install(monkeypatch):
+    """Подменяет клиент tmdb-sync фейком; кэш и память о пакетных ручках — с нуля."""
+    clients: list[httpx.AsyncClient] = []
+
+    def _install(fake: FakeTmdbSync) -> FakeTmdbSync:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(fake), base_url="http://tmdb-sync")
+        clients.append(client)
+        monkeypatch.setattr(tsc, "_client", client)
+        return fake
+
+    monkeypatch.setattr(tsc, "_bulk_sem", None)
+    tsc._cache.clear()
+    tsc._bulk_unsupported_until.clear()
+    yield _install
+    tsc._cache.clear()
+    tsc._bulk_unsupported_until.clear()
+    for client in clients:
+        await client.aclose()
+
+
+async def test_bulk_chunks_and_cache(install, monkeypatch):
+    fake = install(FakeTmdbSync())
+    monkeypatch.setattr(tsc, "TMDB_SYNC_BULK_CHUNK", 2)
+
+    docs = await tsc.get_movies_bulk([1, 2, 3, 4, 5])
+    assert sorted(docs) == [1, 2, 3, 4, 5]
+    assert fake.count("POST", "/movies/bulk") == 3  # чанки по 2
+    assert fake.count("GET") == 0
+
+    # повтор целиком из кэша, одиночный GET — тоже
+    assert await tsc.get_movies_bulk([5, 1]) == {5: docs[5], 1: docs[1]}
+    assert await tsc.get_movie(3) == docs[3]
+    assert len(fake.requests) == 3
+
+
+async def test_bulk_missing_ids_are_dropped(install):
+    fake = install(FakeTmdbSync())
+    fake.missing = {2}
+    frames = await tsc.get_frames_bulk([1, 2, 3])
+    assert sorted(frames) == [1, 3]
+    assert frames[1][0]["path"] == "/1-0.jpg"
+
+
+async def test_fallback_to_single_requests_on_404(install):
+    fake = install(FakeTmdbSync(bulk=False, bulk_status=404))
+    fake.missing = {3}
+
+    docs = await tsc.get_movies_bulk([1, 2, 3])
+    assert sorted(docs) == [1, 2]
+    assert fake.count("POST") == 1
+    assert fake.count("GET", "/movies/") == 3
+
+    # «ручки нет» помним: новые id идут сразу одиночными запросами
+    await tsc.get_movies_bulk([4])
+    assert fake.count("POST") == 1
+
+
+async def test_unsupported_bulk_is_rechecked(install):
+    fake = install(FakeTmdbSync(bulk=False, bulk_status=405))
+    await tsc.get_movies_bulk([1])
+    assert fake.count("POST") == 1
+
+    # срок вышел — снова пробуем пакетную ручку
+    tsc._bulk_unsupported_until["/movies/bulk"] = 0.0
+    fake.bulk = True
+    await tsc.get_movies_bulk([2])
+    assert fake.count("POST") == 2
+    assert "/movies/bulk" not in tsc._bulk_unsupported_until
+
+
+async def test_transient_bulk_error_is_not_remembered(install):
+    fake = install(FakeTmdbSync(bulk=False, bulk_status=503))
+    with pytest.raises(httpx.HTTPStatusError):
+        await tsc.get_movies_bulk([1])
+    assert tsc._bulk_unsupported_until == {}
+
+    fake.bulk = True
+    assert sorted(await tsc.get_movies_bulk([1, 2])) == [1, 2]
+    assert fake.count("GET") == 0
+
+
+async def test_bulk_concurrency_is_shared_across_calls(install, monkeypatch):
+    fake = install(FakeTmdbSync(delay=0.01))
+    monkeypatch.setattr(tsc, "TMDB_SYNC_BULK_CHUNK", 1)
+    monkeypatch.setattr(tsc, "TMDB_SYNC_BULK_CONCURRENCY", 3)
+    monkeypatch.setattr(tsc, "_bulk_sem", None)
+
+    # как пачки iter_round_specs: много параллельных вызовов по много чанков
+    await asyncio.gather(*(tsc.get_frames_bulk(range(i * 10, i * 10 + 10)) for i in range(5)))
+    assert fake.count("POST") == 50
+    assert fake.max_in_flight <= 3
+
+
+def _items(n: int) -> list:
+    return [SimpleNamespace(tmdb_id=i, _type="movie", pool_keys=None) for i in range(1, n + 1)]
+
+
+async def _build(seed: int, n: int, **kwargs) -> list[dict]:
+    rng = random.Random(seed)
+    return [spec async for spec in iter_round_specs(_items(n), "FOUR_FRAMES_ONE_TITLE", rng, **kwargs)]
+
+
+async def test_iter_round_specs_uses_bulk_and_is_deterministic(install):
+    fake = install(FakeTmdbSync())
+
+    first = await _build(42, 7, chunk_size=3)
+    assert [s["correct_tmdb_id"] for s in first] == list(range(1, 8))
+    assert fake.count("POST", "/movies/bulk") == 3
+    assert fake.count("POST", "/movies/frames/bulk") == 3
+    assert fake.count("GET", "/movies/1") == 0  # без одиночных /movies/{id}
+
+    for spec in first:
+        assert len(spec["frame_paths"]) == 4
+        ids = [o["id"] for o in spec["options"]]
+        assert len(set(ids)) == 4
+        assert ids[spec["correct_index"]] == spec["correct_tmdb_id"]
+
+    # тот же seed — те же раунды, как бы ни резались пачки
+    tsc._cache.clear()
+    assert await _build(42, 7, chunk_size=2) == first
+    assert await _build(43, 7, chunk_size=3) != first
+
+
+async def test_iter_round_specs_prefers_manifests(install):
+    fake = install(FakeTmdbSync())
+    manifests = {(i, "movie"): [f"/m{i}.jpg"] for i in range(1, 4)}
+
+    specs = await _build(1, 3, manifests=manifests)
+    assert [s["frame_paths"] for s in specs] == [["/m1.jpg"], ["/m2.jpg"], ["/m3.jpg"]]
+    assert fake.count("POST", "/movies/frames/bulk") == 0
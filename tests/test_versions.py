@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import versions
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+
+class FakeSession:
+    """Отдаёт строку последней версии; row=None — версии ещё нет."""
+
+    def __init__(self, row=None):
+        self.row = row
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        return FakeResult(self.row)
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    versions._latest_cache.clear()
+    yield
+    versions._latest_cache.clear()
+
+
+async def test_missing_version_is_not_cached():
+    session = FakeSession()
+    assert await versions.get_latest_version(session, 1) is None
+
+    # первая публикация видна сразу, без ожидания TTL
+    session.row = SimpleNamespace(id=10, version=1, size=5)
+    assert await versions.get_latest_version(session, 1) == versions.LatestVersion(id=10, version=1, size=5)
+    assert await versions.get_latest_version(session, 1) == versions.LatestVersion(id=10, version=1, size=5)
+    assert session.queries == 2
+
+
+async def test_publish_notification_invalidates():
+    session = FakeSession(SimpleNamespace(id=10, version=1, size=5))
+    await versions.get_latest_version(session, 1)
+
+    session.row = SimpleNamespace(id=11, version=2, size=6)
+    versions._on_published(None, 0, versions.VERSION_CHANNEL, "1")
+    assert (await versions.get_latest_version(session, 1)).id == 11
+
+    versions._on_published(None, 0, versions.VERSION_CHANNEL, "garbage")  # не падает